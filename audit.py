@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+AUDIT_PATH = os.getenv("AUDIT_PATH", "aghai_audit.log")
+AUDIT_FSYNC = os.getenv("AUDIT_FSYNC", "0") == "1"  # fsync every entry, not only on close
+
+MAGIC = b"AGHAIAUD\x01"
+HEADER = struct.Struct("<QdBH")  # seq, unix time, op, payload length
+HASH_SIZE = 32
+GENESIS = bytes(HASH_SIZE)
+
+CAST, REVOKE, CLEAR, IMPORT = 1, 2, 3, 4
+OPS = {"insert": CAST, "delete": REVOKE, "clear": CLEAR, "import": IMPORT}
+OP_NAMES = {CAST: "cast", REVOKE: "revoke", CLEAR: "clear", IMPORT: "import"}
+
+# ==========================
+# BALLOT AUDIT LOG
+# ==========================
+# Append-only file of every ballot cast, revoked (including the revoke before
+# a recast) and cleared. After MAGIC, each entry is
+#
+#   seq, time, op, length (HEADER) | payload (JSON [table, telegram_id, row]) | hash
+#
+# where hash = sha256(previous hash + header + payload), starting from GENESIS.
+# Changing, dropping or reordering any entry breaks every hash after it.
+#
+# verify() walks the file through a memory map and, once it checks out, saves
+# a checkpoint (offset, seq, hash) next to it; the next run starts there, so
+# only entries added since are hashed. A checkpoint is only trusted if the
+# hash it names is still the one stored at its offset.
+
+class Verification:
+    def __init__(self, entries=0, seq=0, last_hash=GENESIS, offset=len(MAGIC), error=None, resumed_from=0):
+        self.entries = entries
+        self.seq = seq
+        self.last_hash = last_hash
+        self.offset = offset  # end of the last complete entry
+        self.error = error
+        self.resumed_from = resumed_from
+        self.trailing = 0  # bytes of an entry cut short by a crash
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self):
+        state = "OK" if self.ok else f"BROKEN: {self.error}"
+        return (
+            f"{state}; {self.entries} entries checked (resumed after entry {self.resumed_from}), "
+            f"last entry {self.seq}, head {self.last_hash.hex()[:16]}"
+            + (f", {self.trailing} bytes of an incomplete entry at the end" if self.trailing else "")
+        )
+
+
+def verify(path: str = AUDIT_PATH, use_checkpoint: bool = True, save_checkpoint: bool = True) -> Verification:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return Verification()
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(MAGIC)] != MAGIC:
+            return Verification(error="not an audit log", offset=0)
+        start = _load_checkpoint(path, mm) if use_checkpoint else None
+        result = _scan(mm, *(start or (len(MAGIC), 0, GENESIS)))
+
+    if result.ok and save_checkpoint and result.seq > result.resumed_from:
+        _save_checkpoint(path, result)
+    return result
+
+
+def _scan(mm, offset, seq, last_hash) -> Verification:
+    result = Verification(seq=seq, last_hash=last_hash, offset=offset, resumed_from=seq)
+    check = True
+    view = memoryview(mm)
+    size = len(mm)
+    try:
+        while offset + HEADER.size <= size:
+            entry_seq, _, op, length = HEADER.unpack_from(mm, offset)
+            end = offset + HEADER.size + length + HASH_SIZE
+            if end > size:
+                break
+            stored = mm[end - HASH_SIZE:end]
+            if check:
+                if entry_seq != result.seq + 1 or op not in OP_NAMES:
+                    result.error = f"entry {result.seq + 1} at byte {offset} is out of sequence or malformed"
+                    check = False
+                else:
+                    digest = hashlib.sha256(result.last_hash)
+                    digest.update(view[offset:end - HASH_SIZE])
+                    if digest.digest() != stored:
+                        result.error = f"entry {entry_seq} at byte {offset} does not match the hash chain"
+                        check = False
+                if check:
+                    result.entries += 1
+            # Past the first error only the framing is followed, to find the end
+            result.seq = entry_seq
+            result.last_hash = stored
+            result.offset = offset = end
+        result.trailing = size - result.offset
+    finally:
+        view.release()
+    return result
+
+
+def _checkpoint_path(path):
+    return path + ".ckpt"
+
+
+def _load_checkpoint(path, mm):
+    try:
+        with open(_checkpoint_path(path), encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        offset, seq, last_hash = checkpoint["offset"], checkpoint["seq"], bytes.fromhex(checkpoint["hash"])
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(MAGIC) + HASH_SIZE <= offset <= len(mm) and mm[offset - HASH_SIZE:offset] == last_hash:
+        return offset, seq, last_hash
+    logger.warning("Audit checkpoint does not match %s; verifying from the start", path)
+    return None
+
+
+def _save_checkpoint(path, result):
+    temp = _checkpoint_path(path) + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump({"offset": result.offset, "seq": result.seq, "hash": result.last_hash.hex()}, f)
+    os.replace(temp, _checkpoint_path(path))
+
+
+def entries(path: str = AUDIT_PATH):
+    # (seq, time, op name, table, telegram_id, row) for every complete entry
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = len(MAGIC)
+        while offset + HEADER.size <= len(mm):
+            seq, at, op, length = HEADER.unpack_from(mm, offset)
+            payload = offset + HEADER.size
+            if payload + length + HASH_SIZE > len(mm):
+                return
+            table, key, row = json.loads(mm[payload:payload + length])
+            yield seq, at, OP_NAMES.get(op, str(op)), table, key, row
+            offset = payload + length + HASH_SIZE
+
+
+class AuditLog:
+    def __init__(self, path: str = AUDIT_PATH):
+        self.path = path
+        self._file = None
+        self.seq = 0
+        self.last_hash = GENESIS
+
+    def open(self):
+        result = verify(self.path)
+        if not result.ok:
+            # Keep appending after what is there; verify() keeps reporting the break
+            logger.error("Audit log %s failed verification: %s", self.path, result.error)
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+        elif result.trailing:
+            logger.warning("Dropping an incomplete entry at the end of %s", self.path)
+            self._file.truncate(result.offset)
+        self.seq = result.seq
+        self.last_hash = result.last_hash
+        logger.info("Audit log %s open at entry %d (%s)", self.path, self.seq, result)
+
+    def close(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def attach(self, store, tables):
+        # Subscribes only; open() the file before the store sees any writes
+        store.subscribe(lambda table, op, key, values: self.on_change(table, op, key, values, tables))
+
+    def on_change(self, table, op, key, values, tables):
+        if table in tables and op in OPS:
+            self.append(OPS[op], table, key, values)
+
+    def append(self, op: int, table: str, key=None, values=None):
+        payload = json.dumps([table, key, values], separators=(",", ":"), ensure_ascii=False).encode()
+        header = HEADER.pack(self.seq + 1, time.time(), op, len(payload))
+        digest = hashlib.sha256(self.last_hash)
+        digest.update(header)
+        digest.update(payload)
+        entry_hash = digest.digest()
+
+        self._file.write(header + payload + entry_hash)
+        self._file.flush()
+        if AUDIT_FSYNC:
+            os.fsync(self._file.fileno())
+        self.seq += 1
+        self.last_hash = entry_hash
+
+
+# Usage: python audit.py [verify|dump] [path]
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    log_path = sys.argv[2] if len(sys.argv) > 2 else AUDIT_PATH
+    if command == "dump":
+        for seq, at, op, table, key, row in entries(log_path):
+            print(seq, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at)), op, table, key, row or "")
+    else:
+        started = time.perf_counter()
+        outcome = verify(log_path)
+        print(f"{outcome} in {time.perf_counter() - started:.2f}s")
+        sys.exit(0 if outcome.ok else 1)
@@ -0,0 +1,223 @@
+"""Benchmarks for the eligibility, voting and results hot paths.
+
+    python bench.py --sizes 100,1000,10000,50000 --output bench_results.json
+
+For each size the store is filled with that many registrations, ballots and
+proxies, then every path is timed over --iterations runs. Micro benchmarks
+call the helper functions directly; macro benchmarks push synthetic Updates
+through the real Application (fake Telegram and Sheets backends, no latency).
+Results are written as JSON so runs of different versions can be diffed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+os.environ["SHEETS_BACKEND"] = "fake"
+os.environ["FAKE_SHEETS_LATENCY"] = "0"
+os.environ["FAKE_SHEETS_QUOTA_PER_MINUTE"] = "0"
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+WORK_DIR = tempfile.mkdtemp(prefix="aghai-bench-")
+os.environ["DB_PATH"] = os.path.join(WORK_DIR, "bench.db")
+os.environ["AUDIT_PATH"] = os.path.join(WORK_DIR, "bench_audit.log")
+os.environ["ROSTER_PATH"] = os.path.join(WORK_DIR, "roster.csv")
+
+from telegram.ext import ApplicationBuilder  # noqa: E402
+
+import bot  # noqa: E402
+from fake_telegram import FakeTelegramRequest, callback_update, message_update  # noqa: E402
+
+MEMBER_BASE = 20_000_000  # seeded members are MEMBER_BASE + n
+FRESH_BASE = 90_000_000   # members created during a benchmark
+
+
+# ==========================
+# DATA
+# ==========================
+
+def seed(rows: int):
+    conn = bot.store.conn
+    with conn:
+        for table in bot.store.columns:
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM outbox")
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ids = [str(MEMBER_BASE + n) for n in range(rows)]
+    bot.store.import_rows("registrations", [
+        [now, member, f"Member {member}", f"Lot {n % 400 + 1} Block {n % 37 + 1}", "0917", "m@example.com",
+         "Registered Owner", "Yes", "No", "", "YES"]
+        for n, member in enumerate(ids)
+    ])
+    election = bot.DEFAULT_ELECTION
+    bot.store.import_rows(election.table, [
+        [now, member, f"Member {member}"] + [random.choice(q.options) for q in election.questions]
+        for member in ids
+    ])
+    bot.store.import_rows("proxies", [
+        [now, member, f"Member {member}", f"Lot {n % 400 + 1}", "Street", "Proxy", "Lot 1", "0917", "2026-02-01"]
+        for n, member in enumerate(ids)
+    ])
+    # Stands in for the first import from the sheets, which the bot waits for
+    bot.store.set_meta("sheets_imported_at", now)
+    return ids
+
+
+# ==========================
+# TIMING
+# ==========================
+
+def summarize(name, rows, samples):
+    samples_us = [s * 1e6 for s in samples]
+    cuts = statistics.quantiles(samples_us, n=100, method="inclusive") if len(samples_us) > 1 else samples_us * 99
+    return {
+        "name": name,
+        "rows": rows,
+        "iterations": len(samples),
+        "mean_us": round(statistics.fmean(samples_us), 2),
+        "p50_us": round(cuts[49], 2),
+        "p95_us": round(cuts[94], 2),
+        "p99_us": round(cuts[98], 2),
+        "ops_per_sec": round(len(samples) / sum(samples), 1),
+    }
+
+
+def time_sync(fn, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def ballot_updates(app, voter):
+    election = bot.DEFAULT_ELECTION
+    if bot.BALLOT_MODE == "compact":
+        taps = [f"c|{election.id}|{q.id}|0" for q in election.questions] + [f"c|{election.id}|submit"]
+    else:
+        taps = [f"a|{election.id}|{q.id}|0" for q in election.questions]
+    return [callback_update(app, voter, data) for data in taps]
+
+
+async def time_updates(app, scripts):
+    # Each script is a list of Updates timed together (one ballot, one command, ...)
+    samples = []
+    for updates in scripts:
+        started = time.perf_counter()
+        for update in updates:
+            await app.process_update(update)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+# ==========================
+# BENCHMARKS
+# ==========================
+
+async def run_size(app, rows, iterations, fresh_ids):
+    ids = seed(rows)
+    picks = [random.choice(ids) for _ in range(iterations)]
+    admin = bot.ADMIN_IDS[0]
+    results = []
+
+    # Micro: helper functions called directly
+    results.append(summarize("has_submitted_prevote", rows, time_sync(bot.has_submitted_prevote, [(i,) for i in picks])))
+    results.append(summarize("has_voted", rows, time_sync(bot.has_voted, [(i,) for i in picks])))
+
+    cleared = random.sample(ids, min(iterations, rows))
+    results.append(summarize("clear_user_vote", rows, time_sync(bot.clear_user_vote, [(i,) for i in cleared])))
+
+    # Macro: full updates through the Application
+    results.append(summarize("results", rows, await time_updates(app, [
+        [message_update(app, admin, "/results")] for _ in range(max(iterations // 10, 5))
+    ])))
+    results.append(summarize("results_csv", rows, await time_updates(app, [
+        [message_update(app, admin, "/results csv")] for _ in range(max(iterations // 50, 3))
+    ])))
+    results.append(summarize("proxy_start_already_submitted", rows, await time_updates(app, [
+        [message_update(app, int(i), "/proxy")] for i in picks
+    ])))
+
+    voters = [next(fresh_ids) for _ in range(iterations)]
+    bot.store.import_rows("registrations", [
+        ["", str(voter), f"Voter {voter}", "Lot 1", "", "", "Registered Owner", "Yes", "No", "", "YES"]
+        for voter in voters
+    ])
+    results.append(summarize("proxy_start_new", rows, await time_updates(app, [
+        [message_update(app, voter, "/proxy")] for voter in voters
+    ])))
+    results.append(summarize("button_handler_ballot", rows, await time_updates(app, [
+        [callback_update(app, voter, bot.DEFAULT_ELECTION.begin_data)] + ballot_updates(app, voter)
+        for voter in voters
+    ])))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    random.seed(args.seed)
+    bot.VOTING_DEADLINE = datetime.max
+
+    builder = ApplicationBuilder().token(os.environ["BOT_TOKEN"]).request(FakeTelegramRequest(0)).get_updates_request(
+        FakeTelegramRequest(0)
+    )
+    app = bot.build_application(builder)
+    fresh_ids = iter(range(FRESH_BASE, FRESH_BASE + 10_000_000))
+
+    results = []
+    # post_init (sheet loading) does not run here, so open the audit log directly
+    bot.audit_log.open()
+    async with app:
+        for rows in args.sizes:
+            size_results = await run_size(app, rows, args.iterations, fresh_ids)
+            for result in size_results:
+                print(f"{result['name']:<32}{rows:>8}{result['p50_us']:>12}{result['p99_us']:>12}{result['ops_per_sec']:>12}")
+            results.extend(size_results)
+    # Once the application has shut down and flushed its persistence
+    await bot.post_shutdown(app)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,50000",
+                        type=lambda value: [int(size) for size in value.split(",")])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=2026)
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"{'benchmark':<32}{'rows':>8}{'p50 us':>12}{'p99 us':>12}{'ops/s':>12}")
+    asyncio.run(main(args))
@@ -1,28 +1,70 @@
+import asyncio
+import audit
+import csv
+import hashlib
 import json
 import os
+import signal
+import tempfile
+import time
+import uuid
 import logging
 from datetime import datetime
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
+import broadcast
+import metrics
+import persistence
+import sheets
+import web
+from concurrency import PerUserUpdateProcessor, user_locks
+from elections import load_elections
+from live import ResultsFeed
+from lots import LotIndex, LotTally
+from roster import ROSTER_PATH, Roster
+from sessions import BallotForm, PrevoteForm, ProxyForm, Session, SessionTracker, SESSION_IDLE_SECONDS, SESSION_SWEEP_SECONDS
+from sheet_index import SheetIndex
+from store import Store
+from tally import Tally
+from writer import SheetWriter
 from telegram.ext import ConversationHandler, MessageHandler, filters
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder,
+    Application,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
+    TypeHandler,
+    ApplicationHandlerStop,
 )
 
 # ==========================
 # CONFIGURATION
 # ==========================
 
+STARTED_AT = time.monotonic()
+
 TOKEN = os.getenv("BOT_TOKEN")
 
 ADMIN_IDS = [8324041197, 1037677076]
 
 VOTING_OPEN = True
+VOTING_DEADLINE = datetime(2026, 3, 1, 0, 0)
 REMINDER_INTERVAL_SECONDS = 86400  # Once per day
+RESULTS_PAGE_SIZE = 20  # voters per /results page, well under Telegram's 4096 characters
+SHEET_REFRESH_SECONDS = 60  # Pick up rows added to the sheets by hand
+# "stepwise": one message edit per question (fewest Telegram calls);
+# "compact": every question in one message with toggles and one Submit, so
+# answers can be reviewed first, at one more callback and edit per ballot
+BALLOT_MODE = os.getenv("BALLOT_MODE", "stepwise")
+
+PORT = int(os.getenv("PORT", "10000"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public base URL; polling is used when unset
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{TOKEN}".encode()).hexdigest()[:32]
+RESULTS_TOKEN = os.getenv("RESULTS_TOKEN")  # enables /results/stream on the web server
+STARTUP_WAIT_SECONDS = 5  # how long an update waits for the first sheet import
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))  # across users; one at a time per user
 
 # ==========================
 # LOGGING
@@ -31,45 +73,12 @@ REMINDER_INTERVAL_SECONDS = 86400  # Once per day
 logging.basicConfig(level=logging.INFO)
 
 # ==========================
-# QUESTIONS
+# ELECTIONS
 # ==========================
+# Questions and options live in ballots.json; see elections.py
 
-QUESTIONS = {
-    "q1": """AGHAI Members’ Special Assembly to APPROVE/REJECT the following URGENT resolution:
-
-1. APPROVE/REJECT the conduct of immediate AGHAI Board elections to ensure continuity of governance and prevent any leadership or administrative vacuum after April 1, 2026, when the incoming Board is scheduled to officially assume responsibility.
-""",
-
-    "q2": """2. APPROVE/REJECT the appointment of the following nominees to serve as the AGHAI Election Committee:
-
-• Manny de Leon  
-• Annabelle Yong  
-• Conrad Alampay  
-• Ernie Manansala  
-• Elvie Guzman  
-
-All of whom have agreed to serve.
-""",
-
-    "q3": """3. APPROVE/REJECT the adoption of Electronic Online Voting for the 2026 AGHAI elections using secure platforms with identity verification, audit trails, and safeguards in compliance with RA 9904 and DHSUD guidelines.
-""",
-
-    "q4": """4. APPROVE ONE of the following proposed director term structures:
-
-4a. All 11 directors serve 2-year terms; elections every 2 years.
-
-OR
-
-4b. Top 5 serve 2 years; next 6 serve 1 year to retain staggered terms.
-"""
-}
-
-OPTIONS = {
-    "q1": ["APPROVE", "REJECT"],
-    "q2": ["APPROVE", "REJECT"],
-    "q3": ["APPROVE", "REJECT"],
-    "q4": ["4a", "4b"],
-}
+ELECTIONS = load_elections()
+DEFAULT_ELECTION = next(iter(ELECTIONS.values()))
 
 # ==========================
 # START
@@ -142,7 +151,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(query.from_user.id)
 
     # Auto deadline check (March 1, 2026)
-    if datetime.now() >= datetime(2026, 3, 1, 0, 0):
+    if datetime.now() >= VOTING_DEADLINE:
         VOTING_OPEN = False
 
     if not VOTING_OPEN:
@@ -153,7 +162,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_main_menu(query, context)
         return
     # ================= BEGIN BUTTON =================
-    if query.data == "begin":
+    # Handles begin and begin|<election>
+    if query.data == "begin" or query.data.startswith("begin|"):
         await handle_begin(query, user_id, context)
         return
 # ================= PREVOTE BUTTON =================
@@ -161,52 +171,84 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Trigger conversation start manually
         return await prevote_start(update, context)
 # ================= PROXY BUTTON =================
-    
-    # ================= REVOTE BUTTON =================
-    if query.data == "revote_button":
-        if has_voted(user_id):
-            clear_user_vote(user_id)
 
-        keyboard = [[InlineKeyboardButton("🗳 Begin Voting Again", callback_data="begin")]]
+    # ================= REVOTE BUTTON =================
+    # Handles revote|<election> (revote_button from older messages)
+    if query.data == "revote_button" or query.data.startswith("revote|"):
+        election = ELECTIONS.get(query.data.partition("|")[2], DEFAULT_ELECTION)
+        async with user_locks.hold(user_id):
+            if has_voted(user_id, election):
+                clear_user_vote(user_id, election)
+            context.user_data.ballot = None
+
+        keyboard = [[InlineKeyboardButton("🗳 Begin Voting Again", callback_data=election.begin_data)]]
         await query.edit_message_text(
             "Your previous vote has been cleared.\n\nClick below to vote again.",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         return
 
-# ================= VOTING ANSWERS =================
-    # Handles q1|APPROVE, q2|REJECT, etc.
-    if "|" in query.data:
-        q_key, answer = query.data.split("|")
+# ================= COMPACT BALLOT =================
+    # Handles c|<election>|<question>|<n> toggles and c|<election>|submit
+    if query.data.startswith("c|"):
+        await handle_compact_ballot(query, user_id, context)
+        return
 
-        if "voting_answers" not in context.user_data:
-            context.user_data["voting_answers"] = {}
+# ================= VOTING ANSWERS =================
+    # Handles a|<election>|<question>|<n>
+    if query.data.startswith("a|"):
+        parts = query.data.split("|")
+        election = ELECTIONS.get(parts[1]) if len(parts) == 4 else None
+        answers = active_ballot(context, election)
+        answer = election.option(parts[2], parts[3]) if answers is not None else None
+
+        # Taps on a ballot that was already submitted, or never begun, carry no key
+        if answer is None:
+            await show_stale_ballot(query, user_id, election or DEFAULT_ELECTION)
+            return
 
-        context.user_data["voting_answers"][q_key] = answer
+        answers[parts[2]] = answer
 
-        next_q = get_next_question(q_key)
+        next_q = election.next_question[parts[2]]
         if next_q:
-            await ask_question(query, next_q)
+            await ask_question(query, election, next_q)
         else:
-            # Save votes to Google Sheet
-            answers = context.user_data["voting_answers"]
-            voting_sheet.append_row([
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                user_id,
-                query.from_user.full_name,
-                answers.get("q1", ""),
-                answers.get("q2", ""),
-                answers.get("q3", ""),
-                answers.get("q4", "")
-            ])
-
-            keyboard = [[InlineKeyboardButton("🔁 Change My Vote", callback_data="revote_button")]]
-            await query.edit_message_text(
-                "✅ Thank you. Your vote has been recorded securely.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+            await submit_ballot(query, user_id, context, election)
+        return
+
+    # Answer buttons from before ballots were defined in ballots.json
+    if "|" in query.data:
+        await show_stale_ballot(query, user_id, DEFAULT_ELECTION)
         return
 
+# ================= SUBMIT BALLOT =================
+
+async def submit_ballot(query, user_id, context, election):
+    # Save votes (mirrored to the Google Sheet in the background)
+    ballot, context.user_data.ballot = context.user_data.ballot, None
+    async with user_locks.hold(user_id):
+        if has_voted(user_id, election):
+            await show_stale_ballot(query, user_id, election)
+            return
+        if lot_index.lot_ballot(election.table, user_id):
+            await show_lot_voted(query, user_id, election)
+            return
+        # A replayed submit of the same ballot is a no-op
+        store.insert(election.table, election.row(
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            user_id,
+            query.from_user.full_name,
+            ballot.answers
+        ), idempotency_key=ballot.key)
+
+    keyboard = [[InlineKeyboardButton("🔁 Change My Vote", callback_data=election.revote_data)]]
+    if len(ELECTIONS) > 1:
+        keyboard.append([InlineKeyboardButton("🗳 Other Ballots", callback_data="begin")])
+    await query.edit_message_text(
+        "✅ Thank you. Your vote has been recorded securely.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
 # ================= HANDLE BEGIN =================
 
 async def handle_begin(query, user_id, context):
@@ -219,41 +261,125 @@ async def handle_begin(query, user_id, context):
         )
         return
 
-    if has_voted(user_id):
-        keyboard = [[InlineKeyboardButton("🔁 Change My Vote", callback_data="revote_button")]]
+    election_id = query.data.partition("|")[2]
+    if not election_id and len(ELECTIONS) > 1:
+        await show_election_picker(query, user_id)
+        return
+    election = ELECTIONS.get(election_id, DEFAULT_ELECTION)
+
+    if has_voted(user_id, election):
+        keyboard = [[InlineKeyboardButton("🔁 Change My Vote", callback_data=election.revote_data)]]
         await query.edit_message_text(
             "⚠️ You have already voted.",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         return
 
-    context.user_data["voting_answers"] = {}
-    await ask_question(query, "q1")
+    if lot_index.lot_ballot(election.table, user_id):
+        await show_lot_voted(query, user_id, election)
+        return
 
-# ==========================
-# ASK QUESTION
-# ==========================
+    # Each ballot gets its own key so it can only be recorded once
+    context.user_data.ballot = BallotForm(election.id, uuid.uuid4().hex)
+    if BALLOT_MODE == "compact":
+        await query.edit_message_text(
+            proxy_note(user_id, election) + election.compact_text,
+            reply_markup=election.compact_keyboard({})
+        )
+    else:
+        await ask_question(query, election, election.first, proxy_note(user_id, election))
+
+def proxy_note(user_id, election):
+    # Tells a proxy holder which other lots their ballot will count for
+    lots = lot_index.proxied_lots(election.table, user_id) if lot_index.lot_of(user_id) else []
+    if not lots:
+        return ""
+    return f"🤝 As proxy, your ballot also counts for lot(s): {', '.join(lots)}\n\n"
 
-async def ask_question(query, q_key):
+async def show_lot_voted(query, user_id, election):
+    cast = lot_index.lot_ballot(election.table, user_id)
+    keyboard = [[InlineKeyboardButton("🏠 Back to Menu", callback_data="menu")]]
+    await query.edit_message_text(
+        f"⚠️ A ballot has already been cast for your lot ({cast['lot_key']}) by {cast['name']}.\n\n"
+        "Only one ballot per lot is counted.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def show_election_picker(query, user_id):
     keyboard = [
-        [InlineKeyboardButton(opt, callback_data=f"{q_key}|{opt}")]
-        for opt in OPTIONS[q_key]
+        [InlineKeyboardButton(
+            f"{'✅' if has_voted(user_id, election) else '🗳'} {election.title}",
+            callback_data=election.begin_data
+        )]
+        for election in ELECTIONS.values()
     ]
     await query.edit_message_text(
-        QUESTIONS[q_key],
+        "Choose a ballot. ✅ marks ballots you have already cast.",
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+async def show_stale_ballot(query, user_id, election):
+    if has_voted(user_id, election):
+        keyboard = [[InlineKeyboardButton("🔁 Change My Vote", callback_data=election.revote_data)]]
+        await query.edit_message_text(
+            "✅ Your vote has already been recorded.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    else:
+        keyboard = [[InlineKeyboardButton("🗳 Begin Voting", callback_data=election.begin_data)]]
+        await query.edit_message_text(
+            "⚠️ This ballot is no longer active.\n\nClick below to start again.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+def active_ballot(context, election):
+    # Answers of the ballot in progress for this election, or None
+    ballot = context.user_data.ballot
+    if election is None or ballot is None or ballot.election != election.id:
+        return None
+    return ballot.answers
+
 # ==========================
-# NEXT QUESTION
+# ASK QUESTION
 # ==========================
 
-def get_next_question(current):
-    keys = list(QUESTIONS.keys())
-    idx = keys.index(current)
-    if idx + 1 < len(keys):
-        return keys[idx + 1]
-    return None
+async def ask_question(query, election, q_id, note=""):
+    await query.edit_message_text(
+        note + election.by_id[q_id].text,
+        reply_markup=election.stepwise_keyboards[q_id]
+    )
+
+# ==========================
+# COMPACT BALLOT
+# ==========================
+# The whole ballot in one message: one row of toggle buttons per question and
+# a Submit button. A tap only swaps the keyboard; the ballot is written once,
+# on Submit.
+
+async def handle_compact_ballot(query, user_id, context):
+    parts = query.data.split("|")
+    election = ELECTIONS.get(parts[1]) if len(parts) in (3, 4) else None
+    answers = active_ballot(context, election)
+    if answers is None:
+        await show_stale_ballot(query, user_id, election or DEFAULT_ELECTION)
+        return
+
+    if parts[2] == "submit":
+        # The button says how many answers are missing until all are in
+        if election.complete(answers):
+            await submit_ballot(query, user_id, context, election)
+        return
+
+    answer = election.option(parts[2], parts[3]) if len(parts) == 4 else None
+    if answer is None:
+        return
+    # Tapping the selected option again clears it
+    q_id = parts[2]
+    if answers.get(q_id) == answer:
+        del answers[q_id]
+    else:
+        answers[q_id] = answer
+    await query.edit_message_reply_markup(reply_markup=election.compact_keyboard(answers))
 
 # ==========================
 # RESULTS (ADMIN ONLY)
@@ -263,38 +389,96 @@ async def results(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         return
 
-    records = voting_sheet.get_all_records()
+    # /results [election] [csv]
+    args = [arg.lower() for arg in context.args or []]
+    selected = [ELECTIONS[arg] for arg in args if arg in ELECTIONS]
 
-    summary = {q: {opt: 0 for opt in OPTIONS[q]} for q in QUESTIONS}
+    if "csv" in args:
+        await send_results_csv(update, selected[0] if selected else DEFAULT_ELECTION)
+        return
+
+    for election in selected or ELECTIONS.values():
+        # Running counters, kept up to date as ballots are recorded and cleared
+        tally = tallies[election.id]
+        summary = tally.counts
+
+        message = "📊 VOTING SUMMARY\n\n"
+        if len(ELECTIONS) > 1:
+            message += f"{election.title}\n"
+        message += f"Ballots cast: {tally.total}\n\n"
+
+        for q in election.questions:
+            message += f"{q.label}:\n"
+            for opt in q.options:
+                message += f"{opt}: {summary[q.id][opt]}\n"
+            message += "\n"
+
+        # The same ballots weighted by the lots each one represents (own lot + proxies)
+        weighted = lot_tallies[election.id]
+        message += f"Lots represented: {weighted.total}\n\n"
+        for q in election.questions:
+            message += f"{q.label} (by lot):\n"
+            for opt in q.options:
+                message += f"{opt}: {weighted.counts[q.id][opt]}\n"
+            message += "\n"
+
+        await update.message.reply_text(message)
+
+        text, reply_markup = voters_page(election, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
 
-    for row in records:
-        if row.get("Q1") in summary["q1"]:
-            summary["q1"][row["Q1"]] += 1
-        if row.get("Q2") in summary["q2"]:
-            summary["q2"][row["Q2"]] += 1
-        if row.get("Q3") in summary["q3"]:
-            summary["q3"][row["Q3"]] += 1
-        if row.get("Q4") in summary["q4"]:
-            summary["q4"][row["Q4"]] += 1
+def voters_page(election, page: int):
+    total = store.count(election.table)
+    pages = max((total + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE, 1)
+    page = min(max(page, 0), pages - 1)
 
-    message = "📊 VOTING SUMMARY\n\n"
+    message = f"👥 WHO VOTED (page {page + 1}/{pages}):\n\n"
 
-    for q in QUESTIONS:
-        message += f"{q.upper()}:\n"
-        for opt in OPTIONS[q]:
-            message += f"{opt}: {summary[q][opt]}\n"
+    for row in store.page(election.table, page * RESULTS_PAGE_SIZE, RESULTS_PAGE_SIZE):
+        message += f"{row['name']}\n"
+        for q in election.questions:
+            message += f"  {q.id}: {row.get(q.id)}\n"
         message += "\n"
 
-    message += "👥 WHO VOTED:\n\n"
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"results_page|{election.id}|{page - 1}"))
+    if page + 1 < pages:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"results_page|{election.id}|{page + 1}"))
 
-    for row in records:
-        message += f"{row['Name']}\n"
-        message += f"  q1: {row.get('Q1')}\n"
-        message += f"  q2: {row.get('Q2')}\n"
-        message += f"  q3: {row.get('Q3')}\n"
-        message += f"  q4: {row.get('Q4')}\n\n"
+    return message, InlineKeyboardMarkup([buttons]) if buttons else None
 
-    await update.message.reply_text(message)
+async def results_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if query.from_user.id not in ADMIN_IDS:
+        return
+
+    _, election_id, page = query.data.split("|")
+    election = ELECTIONS.get(election_id)
+    if election is None:
+        return
+    text, reply_markup = voters_page(election, int(page))
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+async def send_results_csv(update: Update, election):
+    # Written row by row from a cursor, so the full list is never held in memory
+    with tempfile.NamedTemporaryFile("w", newline="", encoding="utf-8", suffix=".csv", delete=False) as f:
+        writer = csv.writer(f)
+        writer.writerow(election.headers)
+        for row in store.iter_rows(election.table):
+            writer.writerow(row)
+        path = f.name
+
+    try:
+        with open(path, "rb") as document:
+            await update.message.reply_document(
+                document=document,
+                filename=f"aghai_{election.table}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                caption=f"📊 {tallies[election.id].total} ballots"
+            )
+    finally:
+        os.remove(path)
 # ==========================
 # ADMIN COMMANDS
 # ==========================
@@ -313,9 +497,52 @@ async def close_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def clear_votes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id in ADMIN_IDS:
-        save_votes({})
+        for election in ELECTIONS.values():
+            store.clear(election.table)
         await update.message.reply_text("All votes cleared.")
 
+async def verify_audit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    # Only entries added since the last checkpoint are hashed; /audit full rechecks everything
+    full = "full" in [arg.lower() for arg in context.args or []]
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: audit.verify(audit_log.path, use_checkpoint=not full)
+    )
+    await update.message.reply_text(f"{'✅' if result.ok else '🚨'} Audit log: {result}")
+
+async def roster_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    if not len(member_roster):
+        text = "No member roster loaded; registrations are not checked."
+    else:
+        text = f"Member roster: {len(member_roster)} members on {member_roster.lots} lots."
+    await update.message.reply_text(
+        f"{text}\n\nSend a CSV with name and lot columns, captioned /roster, to replace it."
+    )
+
+async def import_roster(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    document = await update.message.document.get_file()
+    data = bytes(await document.download_as_bytearray())
+    try:
+        text = data.decode("utf-8-sig")
+        count = member_roster.load_csv(text)
+    except UnicodeDecodeError:
+        await update.message.reply_text("⚠️ Roster not imported: save the file as CSV (UTF-8) and send it again.")
+        return
+    except (ValueError, csv.Error) as error:
+        await update.message.reply_text(f"⚠️ Roster not imported: {error}")
+        return
+
+    # Saved so the roster is loaded again after a restart
+    with open(ROSTER_PATH + ".tmp", "w", newline="", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(ROSTER_PATH + ".tmp", ROSTER_PATH)
+    await update.message.reply_text(f"✅ Roster imported: {count} members on {member_roster.lots} lots.")
+
 async def get_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         f"Your ID: {update.effective_user.id}\nChat ID: {update.effective_chat.id}"
@@ -326,10 +553,30 @@ async def get_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ==========================
 
 async def reminder(context: ContextTypes.DEFAULT_TYPE):
+    # Remind registered members who have not voted yet; runs in the background
+    if not VOTING_OPEN or datetime.now() >= VOTING_DEADLINE or broadcaster.busy:
+        return
+    recipients = members_without_ballot()
+    if not recipients:
+        return
+    text = (
+        "🗳 Reminder: AGHAI voting is ongoing and you have not voted yet.\n\n"
+        f"Voting closes on {VOTING_DEADLINE:%B} {VOTING_DEADLINE.day}, {VOTING_DEADLINE.year}. "
+        "Send /start to cast your ballot."
+    )
+    broadcaster.create("reminder", text, recipients)
+    broadcaster.start(context.bot, report_broadcast)
+
+async def report_broadcast(bot, name, counts):
     for admin in ADMIN_IDS:
-        await context.bot.send_message(
+        await bot.send_message(
             chat_id=admin,
-            text="Reminder: Voting is ongoing."
+            text=(
+                f"📣 Broadcast '{name}' finished\n"
+                f"Delivered: {counts['delivered']}\n"
+                f"Blocked: {counts['blocked']}\n"
+                f"Failed: {counts['failed']}"
+            )
         )
 # --------------------
 # GOOGLE SHEETS SETUP
@@ -337,11 +584,28 @@ async def reminder(context: ContextTypes.DEFAULT_TYPE):
 scope = ["https://spreadsheets.google.com/feeds",
          "https://www.googleapis.com/auth/drive"]
 
-# Replace this path with Render secret file path
-creds = ServiceAccountCredentials.from_json_keyfile_name("/etc/secrets/credentials.json", scope)
-gs_client = gspread.authorize(creds)
-prevote_sheet = gs_client.open("AGHAI_PreVoting_Records").worksheet("pre_voting_registration")
-voting_sheet = gs_client.open("AGHAI_PreVoting_Records").worksheet("voting_records")
+def connect_sheets():
+    # SHEETS_BACKEND=fake runs against in-memory sheets (local runs and load tests)
+    if os.getenv("SHEETS_BACKEND") == "fake":
+        import fake_gspread
+        for election in ELECTIONS.values():
+            fake_gspread.DEFAULT_HEADERS.setdefault(election.worksheet, election.headers)
+        return fake_gspread.FakeClient()
+    # Replace this path with Render secret file path
+    creds = ServiceAccountCredentials.from_json_keyfile_name("/etc/secrets/credentials.json", scope)
+    return gspread.authorize(creds)
+
+# Nothing is opened here; the first Sheets call authorizes and opens the
+# spreadsheet once, off the event loop
+workbook = sheets.Workbook(connect_sheets, "AGHAI_PreVoting_Records", wrap=metrics.InstrumentedWorksheet)
+prevote_sheet = workbook.worksheet("pre_voting_registration")
+
+# Telegram ID -> row indexes, loaded once and kept in step with our own writes
+prevote_index = SheetIndex(prevote_sheet)
+# One ballot table and worksheet per election
+ballot_indexes = {
+    election.table: SheetIndex(workbook.worksheet(election.worksheet)) for election in ELECTIONS.values()
+}
 # --------------------
 # CONVERSATION STATES
 # --------------------
@@ -351,26 +615,41 @@ FULL_NAME, ADDRESS, MOBILE, EMAIL, MEMBERSHIP_STATUS, ATTENDANCE, NOMINATION_DEC
 # HELPER
 # --------------------
 def has_submitted_prevote(user_id: int):
-    records = prevote_sheet.get_all_records()
-    for row in records:
-        if str(row.get("Telegram ID")) == str(user_id):
-            return True
-    return False
-
-def has_voted(user_id: int):
-    records = voting_sheet.get_all_records()
-    for row in records:
-        if str(row.get("Telegram ID")) == str(user_id):
-            return True
-    return False
-
-
-def clear_user_vote(user_id: int):
-    records = voting_sheet.get_all_records()
-    for idx, row in enumerate(records, start=2):  # row 2 because header is row 1
-        if str(row.get("Telegram ID")) == str(user_id):
-            voting_sheet.delete_rows(idx)
-            return
+    return store.has("registrations", user_id)
+
+def has_voted(user_id: int, election=None):
+    return store.has((election or DEFAULT_ELECTION).table, user_id)
+
+def has_submitted_proxy(user_id: int):
+    return store.has("proxies", user_id)
+
+
+def clear_user_vote(user_id: int, election=None):
+    store.delete((election or DEFAULT_ELECTION).table, user_id)
+
+def members_without_ballot():
+    # Registered members missing a ballot in at least one election
+    members = {}
+    for election in ELECTIONS.values():
+        for (telegram_id,) in store.conn.execute(
+            f"SELECT r.telegram_id FROM registrations r LEFT JOIN {election.table} b USING (telegram_id) "
+            "WHERE b.telegram_id IS NULL"
+        ):
+            members[telegram_id] = True
+    return list(members)
+
+async def refresh_sheet_indexes(context: ContextTypes.DEFAULT_TYPE):
+    # Pick up rows added to the sheets by hand since the last refresh; after a
+    # full read of a sheet, rows edited or removed by hand as well
+    if not sheet_writer.ready.is_set():
+        return
+    async with sheet_writer.lock:
+        refreshed = await asyncio.gather(*(sheets.index_refresh(index) for index in sheet_indexes.values()))
+        for table, (rows, reloaded) in zip(sheet_indexes, refreshed):
+            if reloaded:
+                store.sync_rows(table, rows)
+            else:
+                store.import_rows(table, rows)
 # --------------------
 # /prevote START
 # --------------------
@@ -401,28 +680,40 @@ async def prevote_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("Enter your Full Name:")
 
+    context.user_data.prevote = PrevoteForm()
     return FULL_NAME
 
 # --------------------
 # CONVERSATION HANDLERS
 # --------------------
 async def prevote_full_name(update, context):
-    context.user_data['full_name'] = update.message.text
+    prevote_form(context).full_name = update.message.text
     await update.message.reply_text("Enter your Lot Number / Street Address:")
     return ADDRESS
 
 async def prevote_address(update, context):
-    context.user_data['address'] = update.message.text
+    form = prevote_form(context)
+    ok, name, problem = member_roster.check_member(form.full_name, update.message.text)
+    if not ok:
+        if member_roster.has_lot(update.message.text):
+            await update.message.reply_text(f"⚠️ {problem}\n\nEnter your Full Name:")
+            return FULL_NAME
+        await update.message.reply_text(
+            f"⚠️ {problem}\n\nEnter your Lot Number / Street Address (e.g. Block 3 Lot 12):"
+        )
+        return ADDRESS
+    form.full_name = name or form.full_name
+    form.address = update.message.text
     await update.message.reply_text("Enter your Contact Mobile Number:")
     return MOBILE
 
 async def prevote_mobile(update, context):
-    context.user_data['mobile'] = update.message.text
+    prevote_form(context).mobile = update.message.text
     await update.message.reply_text("Enter your Email Address:")
     return EMAIL
 
 async def prevote_email(update, context):
-    context.user_data['email'] = update.message.text
+    prevote_form(context).email = update.message.text
     keyboard = [
         [InlineKeyboardButton("Registered Owner", callback_data="Registered Owner")],
         [InlineKeyboardButton("Authorized Assignee", callback_data="Authorized Assignee")]
@@ -433,7 +724,7 @@ async def prevote_email(update, context):
 async def prevote_membership_status(update, context):
     query = update.callback_query
     await query.answer()
-    context.user_data['membership_status'] = query.data
+    prevote_form(context).membership_status = query.data
     keyboard = [
         [InlineKeyboardButton("Yes, I will attend personally", callback_data="Yes")],
         [InlineKeyboardButton("I cannot attend but will appoint a proxy", callback_data="Proxy")],
@@ -445,7 +736,7 @@ async def prevote_membership_status(update, context):
 async def prevote_attendance(update, context):
     query = update.callback_query
     await query.answer()
-    context.user_data['attendance'] = query.data
+    prevote_form(context).attendance = query.data
     keyboard = [
         [InlineKeyboardButton("Yes", callback_data="nom_yes")],
         [InlineKeyboardButton("No", callback_data="nom_no")]
@@ -458,14 +749,14 @@ async def prevote_nomination_decision(update, context):
     await query.answer()
 
     if query.data == "nom_no":
-        context.user_data['nomination_yes_no'] = "No"
-        context.user_data['nominee_names'] = ""
+        prevote_form(context).nomination = "No"
+        prevote_form(context).nominee_names = ""
 
         await prevote_declaration_prompt(update, context)
         return DECLARATION
 
     if query.data == "nom_yes":
-        context.user_data['nomination_yes_no'] = "Yes"
+        prevote_form(context).nomination = "Yes"
 
         official_names = [
             "Manny de Leon",
@@ -485,7 +776,14 @@ async def prevote_nomination_decision(update, context):
 
 
 async def prevote_nominee_names(update, context):
-    context.user_data['nominee_names'] = update.message.text
+    names, unknown = member_roster.resolve_names(update.message.text)
+    if unknown or not names:
+        await update.message.reply_text(
+            f"⚠️ Not found on the member roster: {', '.join(unknown) or update.message.text}\n\n"
+            "Enter name(s), separated by commas:"
+        )
+        return NOMINEE_NAMES
+    prevote_form(context).nominee_names = ", ".join(names)
     return await prevote_declaration_prompt(update, context)
 
 async def prevote_declaration_prompt(update, context):
@@ -504,21 +802,26 @@ async def prevote_declaration_prompt(update, context):
 async def prevote_declaration(update, context):
     query = update.callback_query
     await query.answer()
-    context.user_data['declaration_confirmed'] = "YES"
+    form, context.user_data.prevote = prevote_form(context), None
+    form.declaration = "YES"
     user_id = update.effective_user.id
 
-    prevote_sheet.append_row([
+    if not form.complete():
+        await show_form_expired(query, "prevote")
+        return ConversationHandler.END
+
+    store.insert("registrations", [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         user_id,
-        context.user_data['full_name'],
-        context.user_data['address'],
-        context.user_data['mobile'],
-        context.user_data['email'],
-        context.user_data['membership_status'],
-        context.user_data['attendance'],
-        context.user_data.get('nomination_yes_no', "No"),
-        context.user_data.get('nominee_names', ""),
-        context.user_data['declaration_confirmed']
+        form.full_name,
+        form.address,
+        form.mobile,
+        form.email,
+        form.membership_status,
+        form.attendance,
+        form.nomination,
+        form.nominee_names,
+        form.declaration
     ])
 
     # Show success message with "Back to Menu" button
@@ -529,6 +832,24 @@ async def prevote_declaration(update, context):
     )
     return ConversationHandler.END
 
+def prevote_form(context):
+    # A session evicted mid-form starts a new, incomplete form
+    if context.user_data.prevote is None:
+        context.user_data.prevote = PrevoteForm()
+    return context.user_data.prevote
+
+async def show_form_expired(source, form):
+    # source is the callback query or the update that carried the last answer
+    keyboard = [[InlineKeyboardButton("🔁 Start Again", callback_data=form)]]
+    await source.message.reply_text(
+        "⚠️ This form expired before it was finished. Please start again.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def end_prevote(update, context):
+    context.user_data.prevote = None
+    return ConversationHandler.END
+
 # --------------------
 # CONVERSATION HANDLER
 # --------------------
@@ -546,9 +867,13 @@ prevote_conv = ConversationHandler(
         ATTENDANCE: [CallbackQueryHandler(prevote_attendance)],
         NOMINATION_DECISION: [CallbackQueryHandler(prevote_nomination_decision)],
         NOMINEE_NAMES: [MessageHandler(filters.TEXT & ~filters.COMMAND, prevote_nominee_names)],
-        DECLARATION: [CallbackQueryHandler(prevote_declaration)]
+        DECLARATION: [CallbackQueryHandler(prevote_declaration)],
+        ConversationHandler.TIMEOUT: [TypeHandler(Update, end_prevote)],
     },
-    fallbacks=[CommandHandler('cancel', lambda u,c: ConversationHandler.END)]
+    fallbacks=[CommandHandler('cancel', end_prevote)],
+    conversation_timeout=SESSION_IDLE_SECONDS,
+    name="prevote",
+    persistent=True,
 )
 
 
@@ -559,7 +884,48 @@ prevote_conv = ConversationHandler(
 PROXY_AGREE, PROXY_MEMBER_NAME, PROXY_MEMBER_LOT, PROXY_MEMBER_ADDRESS, PROXY_PROXY_NAME, PROXY_PROXY_LOT, PROXY_MOBILE, PROXY_SIGNATURE_DATE = range(8, 16)
 
 # Google Sheet for proxies
-proxy_sheet = gs_client.open("AGHAI_PreVoting_Records").worksheet("proxy_submissions")
+proxy_sheet = workbook.worksheet("proxy_submissions")
+proxy_index = SheetIndex(proxy_sheet)
+
+# Local SQLite store is the system of record; the sheets are a mirror of it
+store = Store({
+    "registrations": prevote_sheet.title,
+    "proxies": proxy_sheet.title,
+})
+for election in ELECTIONS.values():
+    store.add_table(election.table, election.columns, election.worksheet)
+
+# store table -> index of the worksheet it is mirrored to
+sheet_indexes = {"registrations": prevote_index, **ballot_indexes, "proxies": proxy_index}
+sheet_writer = SheetWriter(store, list(sheet_indexes.values()))
+
+tallies = {election.id: Tally(election.options, election.table) for election in ELECTIONS.values()}
+for tally in tallies.values():
+    tally.attach(store)
+
+# Tally changes pushed to observers of /results/stream
+results_feed = ResultsFeed(ELECTIONS, tallies, store)
+results_feed.attach()
+
+# Every ballot cast, revoked and cleared, in a hash-chained file (opened in post_init)
+audit_log = audit.AuditLog()
+audit_log.attach(store, {election.table for election in ELECTIONS.values()})
+
+# Lots and members of the association, checked by the prevote and proxy forms
+member_roster = Roster()
+member_roster.load()
+
+# One ballot per lot; proxy holders vote for the lots they represent
+lot_index = LotIndex(store)
+lot_index.attach()
+lot_tallies = {election.id: LotTally(lot_index, election.options, election.table) for election in ELECTIONS.values()}
+for lot_tally in lot_tallies.values():
+    lot_tally.attach(store)
+
+broadcaster = broadcast.Broadcaster(store)
+
+# Sessions of members idle too long, or beyond the cap, are dropped
+session_tracker = SessionTracker()
 
 # --------------------
 # START PROXY SUBMISSION
@@ -568,22 +934,20 @@ async def proxy_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     # Check if already submitted
-    records = proxy_sheet.get_all_records()
-    for row in records:
-        if str(row.get("Telegram ID")) == str(user_id):
-            keyboard = [[InlineKeyboardButton("🏠 Back to Menu", callback_data="menu")]]
-            if update.callback_query:
-                await update.callback_query.answer()
-                await update.callback_query.message.edit_text(
-                    "⚠️ You have already submitted a Proxy.",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            else:
-                await update.message.reply_text(
-                    "⚠️ You have already submitted a Proxy.",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            return ConversationHandler.END
+    if has_submitted_proxy(user_id):
+        keyboard = [[InlineKeyboardButton("🏠 Back to Menu", callback_data="menu")]]
+        if update.callback_query:
+            await update.callback_query.answer()
+            await update.callback_query.message.edit_text(
+                "⚠️ You have already submitted a Proxy.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+        else:
+            await update.message.reply_text(
+                "⚠️ You have already submitted a Proxy.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+        return ConversationHandler.END
 
     # …rest of your notes code
     keyboard = [[InlineKeyboardButton("I Agree", callback_data="agree")],
@@ -617,6 +981,7 @@ async def proxy_agree(update, context):
         return ConversationHandler.END
 
     # Proceed to member info
+    context.user_data.proxy = ProxyForm()
     await query.edit_message_text("Enter your Full Name (Member/Assignee):")
     return PROXY_MEMBER_NAME
 
@@ -624,49 +989,74 @@ async def proxy_agree(update, context):
 # MEMBER INFO HANDLERS
 # --------------------
 async def proxy_member_name(update, context):
-    context.user_data['proxy_member_name'] = update.message.text
+    proxy_form(context).member_name = update.message.text
     await update.message.reply_text("Enter your Lot Number:")
     return PROXY_MEMBER_LOT
 
 async def proxy_member_lot(update, context):
-    context.user_data['proxy_member_lot'] = update.message.text
+    form = proxy_form(context)
+    ok, name, problem = member_roster.check_member(form.member_name, update.message.text)
+    if not ok:
+        if member_roster.has_lot(update.message.text):
+            await update.message.reply_text(f"⚠️ {problem}\n\nEnter your Full Name (Member/Assignee):")
+            return PROXY_MEMBER_NAME
+        await update.message.reply_text(f"⚠️ {problem}\n\nEnter your Lot Number:")
+        return PROXY_MEMBER_LOT
+    form.member_name = name or form.member_name
+    form.member_lot = update.message.text
     await update.message.reply_text("Enter your Address / Lot location:")
     return PROXY_MEMBER_ADDRESS
 
 async def proxy_member_address(update, context):
-    context.user_data['proxy_member_address'] = update.message.text
+    proxy_form(context).member_address = update.message.text
     await update.message.reply_text("Enter the Proxy Name (person who will vote on your behalf):")
     return PROXY_PROXY_NAME
 
 async def proxy_proxy_name(update, context):
-    context.user_data['proxy_name'] = update.message.text
+    proxy_form(context).proxy_name = update.message.text
     await update.message.reply_text("Enter Proxy Lot Number:")
     return PROXY_PROXY_LOT
 
 async def proxy_proxy_lot(update, context):
-    context.user_data['proxy_lot'] = update.message.text
+    form = proxy_form(context)
+    ok, name, problem = member_roster.check_member(form.proxy_name, update.message.text)
+    if not ok:
+        if member_roster.has_lot(update.message.text):
+            await update.message.reply_text(
+                f"⚠️ {problem}\n\nEnter the Proxy Name (person who will vote on your behalf):"
+            )
+            return PROXY_PROXY_NAME
+        await update.message.reply_text(f"⚠️ {problem}\n\nEnter Proxy Lot Number:")
+        return PROXY_PROXY_LOT
+    form.proxy_name = name or form.proxy_name
+    form.proxy_lot = update.message.text
     await update.message.reply_text("Enter your Mobile Number:")
     return PROXY_MOBILE
 
 async def proxy_mobile(update, context):
-    context.user_data['proxy_mobile'] = update.message.text
+    proxy_form(context).mobile = update.message.text
     await update.message.reply_text("Enter Date of Signature (YYYY-MM-DD):")
     return PROXY_SIGNATURE_DATE
 
 async def proxy_signature_date(update, context):
-    context.user_data['proxy_date'] = update.message.text
+    proxy_form(context).date = update.message.text
 
-    # Save to Google Sheet
-    proxy_sheet.append_row([
+    form, context.user_data.proxy = proxy_form(context), None
+    if not form.complete():
+        await show_form_expired(update, "proxy")
+        return ConversationHandler.END
+
+    # Save proxy (mirrored to the Google Sheet in the background)
+    store.insert("proxies", [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         update.effective_user.id,
-        context.user_data['proxy_member_name'],
-        context.user_data['proxy_member_lot'],
-        context.user_data['proxy_member_address'],
-        context.user_data['proxy_name'],
-        context.user_data['proxy_lot'],
-        context.user_data['proxy_mobile'],
-        context.user_data['proxy_date']
+        form.member_name,
+        form.member_lot,
+        form.member_address,
+        form.proxy_name,
+        form.proxy_lot,
+        form.mobile,
+        form.date
     ])
 
     # Confirmation message
@@ -677,6 +1067,15 @@ async def proxy_signature_date(update, context):
     )
 
     return ConversationHandler.END
+def proxy_form(context):
+    if context.user_data.proxy is None:
+        context.user_data.proxy = ProxyForm()
+    return context.user_data.proxy
+
+async def end_proxy(update, context):
+    context.user_data.proxy = None
+    return ConversationHandler.END
+
 # --------------------
 # PROXY BACK TO MENU
 # --------------------
@@ -704,53 +1103,204 @@ proxy_conv = ConversationHandler(
         PROXY_PROXY_LOT: [MessageHandler(filters.TEXT & ~filters.COMMAND, proxy_proxy_lot)],
         PROXY_MOBILE: [MessageHandler(filters.TEXT & ~filters.COMMAND, proxy_mobile)],
         PROXY_SIGNATURE_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, proxy_signature_date)],
+        ConversationHandler.TIMEOUT: [TypeHandler(Update, end_proxy)],
     },
-    fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)]
+    fallbacks=[CommandHandler("cancel", end_proxy)],
+    conversation_timeout=SESSION_IDLE_SECONDS,
+    name="proxy",
+    persistent=True,
 )
 
 
 
+# ==========================
+# SESSIONS
+# ==========================
+
+async def touch_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Runs before every other handler; looks the session up without creating one
+    user = update.effective_user
+    if user is not None:
+        session_tracker.touch(user.id, context.application.user_data.get(user.id))
+
+async def sweep_sessions(context: ContextTypes.DEFAULT_TYPE):
+    session_tracker.sweep(context.application)
+
+# ==========================
+# STARTUP
+# ==========================
+
+async def wait_for_sheets(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # On a store that has never been filled from the sheets, nobody's earlier
+    # registration or ballot is known yet; hold updates until the import is done
+    if sheet_writer.imported:
+        return
+    try:
+        await asyncio.wait_for(sheet_writer.ready.wait(), STARTUP_WAIT_SECONDS)
+        return
+    except asyncio.TimeoutError:
+        pass
+
+    text = "⏳ The bot is starting up. Please try again in a minute."
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    elif update.effective_message:
+        await update.effective_message.reply_text(text)
+    raise ApplicationHandlerStop
+
+# ==========================
+# ERRORS
+# ==========================
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
+    logging.error("Update %s caused error", update, exc_info=context.error)
+
+    if isinstance(context.error, sheets.SheetsError) and isinstance(update, Update):
+        text = "⚠️ Google Sheets is responding slowly. Please try again in a moment."
+        if update.callback_query:
+            await update.callback_query.message.reply_text(text)
+        elif update.message:
+            await update.message.reply_text(text)
+
+async def post_init(application: Application):
+    audit_log.open()
+    session_tracker.seed(application.user_data)
+    await sheet_writer.start()
+    # Carry on with a broadcast a restart interrupted
+    broadcaster.start(application.bot, report_broadcast)
+
+async def post_shutdown(application: Application):
+    await broadcaster.stop()
+    await sheet_writer.stop()
+    sheets.shutdown()
+    audit_log.close()
+    store.close()
+
 # ==========================
 # MAIN
 # ==========================
 
-def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+def build_application(builder=None):
+    # The load test passes a builder with a fake Telegram request backend
+    builder = builder or ApplicationBuilder().token(TOKEN).request(
+        metrics.InstrumentedRequest(connection_pool_size=256)
+    )
+    app = (
+        builder.concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .persistence(persistence.SQLitePersistence(store))
+        .context_types(ContextTypes(user_data=Session))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
+    app.add_handler(TypeHandler(Update, wait_for_sheets), group=-2)
+    app.add_handler(TypeHandler(Update, touch_session), group=-1)
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("results", results))
+    app.add_handler(CallbackQueryHandler(results_page, pattern="^results_page\\|[a-z0-9_-]+\\|\\d+$"))
     app.add_handler(CommandHandler("openvote", open_vote))
     app.add_handler(CommandHandler("closevote", close_vote))
     app.add_handler(CommandHandler("clearvotes", clear_votes))
+    app.add_handler(CommandHandler("audit", verify_audit))
+    app.add_handler(CommandHandler("roster", roster_status))
+    app.add_handler(MessageHandler(filters.Document.FileExtension("csv") & filters.CaptionRegex(r"^/roster"), import_roster))
     app.add_handler(CommandHandler("getid", get_id))
     app.add_handler(prevote_conv)
     app.add_handler(proxy_conv) 
     app.add_handler(
         CallbackQueryHandler(
             button_handler,
-            pattern="^(begin|menu|revote_button|prevote|q[1-4]\\|.*)$"
+            pattern="^(begin|menu|revote_button|prevote|(begin|revote|a|c)\\|.*|q[1-4]\\|.*)$"
         )
     )
 
+    app.add_error_handler(error_handler)
+
+    metrics.instrument_handlers(app)
+    metrics.track_conversations(prevote=prevote_conv, proxy=proxy_conv)
+    metrics.watch_store(store, sheet_writer, {election.table for election in ELECTIONS.values()})
+    metrics.watch_sessions(app, session_tracker)
+
+    app.job_queue.run_repeating(refresh_sheet_indexes, interval=SHEET_REFRESH_SECONDS, first=SHEET_REFRESH_SECONDS)
+    app.job_queue.run_repeating(reminder, interval=REMINDER_INTERVAL_SECONDS, first=REMINDER_INTERVAL_SECONDS)
+    app.job_queue.run_repeating(sweep_sessions, interval=SESSION_SWEEP_SECONDS, first=SESSION_SWEEP_SECONDS)
+
+    return app
+
+def liveness(application: Application):
+    now = time.monotonic()
+    processor = application.update_processor
+    last = processor.last_processed_at
+    sessions, session_bytes = session_tracker.memory(application.user_data)
+    return {
+        "running": application.running,
+        "mode": "webhook" if WEBHOOK_URL else "polling",
+        "uptime_seconds": round(now - STARTED_AT, 1),
+        "updates_processed": processor.processed,
+        "seconds_since_last_update": round(now - last, 1) if last is not None else None,
+        "users_in_flight": processor.active_users,
+        "sessions": sessions,
+        "session_bytes": session_bytes,
+        "sessions_evicted": session_tracker.evicted,
+        "audit_entries": audit_log.seq,
+        "results_observers": len(results_feed),
+        "sheet_cache_age_seconds": {
+            index.worksheet.title: round(now - index.refreshed_at, 1) if index.refreshed_at is not None else None
+            for index in sheet_indexes.values()
+        },
+        "sheets_ready": sheet_writer.ready.is_set(),
+        "sheets_imported": sheet_writer.imported,
+        "sheet_write_backlog": sheet_writer.backlog,
+        "sheet_writer_running": sheet_writer.running,
+        "sheet_write_retry_in_seconds": sheet_writer.retry_in,
+    }
+
+async def serve(app: Application):
+    # Bot, job queue and web server all run on this one event loop
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with app:
+        await post_init(app)
+        await app.start()
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}/telegram",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=100,
+            )
+            server = web.start_server(
+                web.create_web_app(app, liveness, WEBHOOK_SECRET, results_feed, RESULTS_TOKEN), PORT
+            )
+        else:
+            await app.updater.start_polling()
+            server = web.start_server(
+                web.create_web_app(app, liveness, results_feed=results_feed, results_token=RESULTS_TOKEN), PORT
+            )
 
-    # Web server for Render
-    import threading
-    from flask import Flask
-
-    def run_web():
-        web_app = Flask(__name__)
-
-        @web_app.route("/")
-        def home():
-            return "Aghai Elections Bot is running!"
-
-        port = int(os.environ.get("PORT", 10000))
-        web_app.run(host="0.0.0.0", port=port)
+        logging.info("Ready for updates %.2fs after start", time.monotonic() - STARTED_AT)
+        print(f"Bot running ({'webhook' if WEBHOOK_URL else 'polling'}) on port {PORT}...")
+        await stop.wait()
 
-    threading.Thread(target=run_web).start()
+        await web.stop_server(server)
+        if app.updater.running:
+            await app.updater.stop()
+        # No broadcast sends through a bot that is shutting down
+        await broadcaster.stop()
+        await app.stop()
+    # After `async with` has shut the application down, which flushes
+    # persistence into the store; only then is the store closed
+    await post_shutdown(app)
 
-    print("Bot running...")
-    app.run_polling()
+def main():
+    logging.info("Module loaded in %.2fs", time.monotonic() - STARTED_AT)
+    app = build_application()
+    logging.info("Application built %.2fs after start", time.monotonic() - STARTED_AT)
+    asyncio.run(serve(app))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+import metrics
+from sheets import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+# Telegram allows about 30 messages per second across all chats
+MESSAGES_PER_SECOND = float(os.getenv("BROADCAST_MESSAGES_PER_SECOND", "25"))
+MAX_IN_FLIGHT = 20
+MAX_ATTEMPTS = 3
+
+# ==========================
+# BROADCASTS
+# ==========================
+# A broadcast is one text sent to a list of members. The recipients are stored
+# with their delivery status (tables broadcasts and broadcast_recipients), so a
+# broadcast interrupted by a restart carries on with the members still pending.
+# Sends go out at MESSAGES_PER_SECOND overall; each member gets one message,
+# so the per-chat limit of one message per second is never reached. A flood
+# wait (RetryAfter) pauses every sender for the time Telegram asks for.
+
+class Broadcaster:
+    def __init__(self, store):
+        self.conn = store.conn
+        self._limiter = TokenBucket(MESSAGES_PER_SECOND * 60, burst=int(MESSAGES_PER_SECOND))
+        self._resume_at = 0
+        self._task = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def create(self, name: str, text: str, recipients) -> int:
+        with self.conn:
+            broadcast_id = self.conn.execute(
+                "INSERT INTO broadcasts (name, text) VALUES (?, ?)", (name, text)
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, telegram_id) VALUES (?, ?)",
+                [(broadcast_id, str(telegram_id)) for telegram_id in recipients],
+            )
+        return broadcast_id
+
+    def counts(self, broadcast_id: int):
+        counts = {"delivered": 0, "failed": 0, "blocked": 0, "pending": 0}
+        for status, count in self.conn.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,),
+        ):
+            counts[status] = count
+        return counts
+
+    def start(self, bot, report=None):
+        # Sends every unfinished broadcast in the background, oldest first.
+        # report(bot, name, counts) is awaited after each one.
+        if not self.busy:
+            self._task = asyncio.create_task(self._run(bot, report))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # --------------------
+    # SENDING
+    # --------------------
+    async def _run(self, bot, report):
+        while True:
+            row = self.conn.execute(
+                "SELECT id, name, text FROM broadcasts WHERE finished_at IS NULL ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            broadcast_id, name, text = row
+            try:
+                await self._send_all(bot, broadcast_id, text)
+            except Exception:
+                logger.exception("Broadcast %d stopped; pending members will be retried", broadcast_id)
+                return
+
+            with self.conn:
+                self.conn.execute("UPDATE broadcasts SET finished_at = CURRENT_TIMESTAMP WHERE id = ?", (broadcast_id,))
+            counts = self.counts(broadcast_id)
+            logger.info("Broadcast %d (%s) finished: %s", broadcast_id, name, counts)
+            if report:
+                await report(bot, name, counts)
+
+    async def _send_all(self, bot, broadcast_id: int, text: str):
+        pending = [
+            telegram_id for (telegram_id,) in self.conn.execute(
+                "SELECT telegram_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending'",
+                (broadcast_id,),
+            )
+        ]
+        logger.info("Broadcast %d: sending to %d members", broadcast_id, len(pending))
+
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        tasks = set()
+        try:
+            for telegram_id in pending:
+                await in_flight.acquire()
+                await self._limiter.acquire()
+                task = asyncio.create_task(self._deliver(bot, broadcast_id, telegram_id, text))
+                task.add_done_callback(lambda _: in_flight.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _deliver(self, bot, broadcast_id: int, telegram_id: str, text: str):
+        status, error = "failed", None
+        for attempt in range(MAX_ATTEMPTS):
+            await self._wait_for_flood()
+            try:
+                await bot.send_message(chat_id=int(telegram_id), text=text)
+                status, error = "delivered", None
+                break
+            except RetryAfter as e:
+                self._pause(e.retry_after)
+                error = str(e)
+            except Forbidden as e:
+                # Blocked the bot or never started it
+                status, error = "blocked", str(e)
+                break
+            except BadRequest as e:
+                error = str(e)
+                break
+            except TelegramError as e:
+                error = str(e)
+                await asyncio.sleep(2 ** attempt)
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE broadcast_recipients SET status = ?, error = ? WHERE broadcast_id = ? AND telegram_id = ?",
+                (status, error, broadcast_id, telegram_id),
+            )
+        metrics.BROADCAST_MESSAGES.labels(status).inc()
+
+    def _pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self._resume_at = max(self._resume_at, loop.time() + float(seconds))
+        logger.warning("Broadcast hit flood control; pausing %ss", seconds)
+
+    async def _wait_for_flood(self):
+        delay = self._resume_at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
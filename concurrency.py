@@ -0,0 +1,98 @@
+import asyncio
+import contextlib
+import time
+
+from telegram.ext import BaseUpdateProcessor
+
+# ==========================
+# PER-USER LOCKS
+# ==========================
+# One asyncio.Lock per Telegram ID, created on first use and evicted as soon
+# as nobody holds or waits for it, so the registry only ever holds the users
+# currently being served. asyncio.Lock wakes waiters in FIFO order.
+
+class UserLocks:
+    def __init__(self):
+        self._locks = {}
+        self._users = {}  # holders + waiters per key
+
+    def __len__(self):
+        return len(self._locks)
+
+    def locked(self, key) -> bool:
+        lock = self._locks.get(str(key))
+        return lock is not None and lock.locked()
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        key = str(key)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+
+# Held by handlers around read-check-write sequences on a member's records
+user_locks = UserLocks()
+
+
+# ==========================
+# PER-USER UPDATE ORDERING
+# ==========================
+# Lets the Application handle updates from different users at the same time
+# while updates from one user still run strictly one after another, in the
+# order they arrived. ConversationHandler states and context.user_data are
+# per user, so they stay consistent.
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # A registry of its own: asyncio.Lock is not reentrant, and handlers
+        # take user_locks while their update holds this one
+        self.locks = UserLocks()
+        self.processed = 0
+        self.last_processed_at = None  # time.monotonic() of the last finished update
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update, coroutine):
+        # The member's own lock is taken before a concurrency slot, so updates
+        # queued behind one member wait without holding slots other members need
+        key = self._key(update)
+        try:
+            if key is None:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+            else:
+                async with self.locks.hold(key), self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            self.processed += 1
+            self.last_processed_at = time.monotonic()
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    @property
+    def active_users(self) -> int:
+        return len(self.locks)
+
+    @staticmethod
+    def _key(update):
+        if not hasattr(update, "effective_user"):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import re
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+BALLOTS_PATH = os.getenv("BALLOTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ballots.json"))
+
+BALLOT_COLUMNS = ["cast_at", "telegram_id", "name"]  # followed by one column per question
+BALLOT_HEADERS = ["Timestamp", "Telegram ID", "Name"]
+MAX_CALLBACK_BYTES = 64  # Telegram's limit on callback_data
+COMPACT_CACHE_SIZE = 4096
+
+_ELECTION_ID = re.compile(r"^[a-z0-9_-]{1,24}$")
+_IDENTIFIER = re.compile(r"^[a-z][a-z0-9_]{0,30}$")  # table and column names
+# Tables the Store keeps for itself; an election's ballots must not land in one
+RESERVED_TABLES = {
+    "registrations", "proxies", "outbox", "idempotency_keys", "conversations", "user_data",
+    "broadcasts", "broadcast_recipients", "member_lots", "proxy_lots", "meta",
+}
+
+# ==========================
+# BALLOT DEFINITIONS
+# ==========================
+# Elections are described in ballots.json:
+#
+#   {"elections": [{"id": "assembly2026", "title": "...",
+#                   "table": "ballots", "worksheet": "voting_records",
+#                   "questions": [{"id": "q1", "label": "Q1", "text": "...",
+#                                  "options": ["APPROVE", "REJECT"]}, ...]}]}
+#
+# Every election is compiled once at startup: the next-question table, the
+# stepwise keyboards and the rows of the compact ballot are built up front, so
+# answering a question is a couple of dict lookups.
+#
+# Callback data carries option positions, not option text:
+#   begin|<election>             start (or pick) an election
+#   a|<election>|<question>|<n>  stepwise answer
+#   c|<election>|<question>|<n>  compact toggle
+#   c|<election>|submit          compact submit
+#   revote|<election>            clear the member's ballot
+
+
+class Question:
+    def __init__(self, definition):
+        self.id = definition["id"]
+        self.label = definition.get("label", self.id.upper())
+        self.text = definition["text"]
+        self.options = tuple(definition["options"])
+        if not _IDENTIFIER.match(self.id):
+            raise ValueError(f"Question id {self.id!r} must be a lowercase identifier")
+        if not self.options:
+            raise ValueError(f"Question {self.id!r} has no options")
+
+
+class Election:
+    def __init__(self, definition):
+        self.id = definition["id"]
+        self.title = definition["title"]
+        self.table = definition.get("table", f"ballots_{self.id.replace('-', '_')}")
+        self.worksheet = definition.get("worksheet", self.table)
+        self.questions = tuple(Question(q) for q in definition["questions"])
+        if not _ELECTION_ID.match(self.id):
+            raise ValueError(f"Election id {self.id!r} must be 1-24 characters of a-z, 0-9, _ or -")
+        if not _IDENTIFIER.match(self.table):
+            raise ValueError(f"Table name {self.table!r} must be a lowercase identifier")
+        if self.table in RESERVED_TABLES or self.table.startswith("sqlite_"):
+            raise ValueError(f"Table name {self.table!r} is reserved for the bot's own records")
+        if not self.questions:
+            raise ValueError(f"Election {self.id!r} has no questions")
+
+        self.by_id = {q.id: q for q in self.questions}
+        if len(self.by_id) != len(self.questions):
+            raise ValueError(f"Election {self.id!r} repeats a question id")
+        clashes = sorted(set(self.by_id) & set(BALLOT_COLUMNS))
+        if clashes:
+            raise ValueError(f"Election {self.id!r} uses reserved question id(s) {', '.join(clashes)}")
+        self.first = self.questions[0].id
+        self.next_question = {
+            q.id: (self.questions[n + 1].id if n + 1 < len(self.questions) else None)
+            for n, q in enumerate(self.questions)
+        }
+        self.columns = BALLOT_COLUMNS + [q.id for q in self.questions]
+        self.headers = BALLOT_HEADERS + [q.label for q in self.questions]
+        self.options = {q.id: list(q.options) for q in self.questions}
+
+        self.begin_data = self._callback("begin", self.id)
+        self.revote_data = self._callback("revote", self.id)
+        self.stepwise_keyboards = {
+            q.id: InlineKeyboardMarkup([
+                [InlineKeyboardButton(opt, callback_data=self._callback("a", self.id, q.id, n))]
+                for n, opt in enumerate(q.options)
+            ])
+            for q in self.questions
+        }
+        # Each question's row of toggles, for every possible selection (None = nothing chosen)
+        self._compact_rows = {
+            (q.id, selected): tuple(
+                InlineKeyboardButton(
+                    f"{'✅ ' if n == selected else ''}{q.label}: {opt}",
+                    callback_data=self._callback("c", self.id, q.id, n),
+                )
+                for n, opt in enumerate(q.options)
+            )
+            for q in self.questions
+            for selected in (None, *range(len(q.options)))
+        }
+        self._submit_rows = [
+            (InlineKeyboardButton(
+                "📨 Submit Ballot" if not missing else f"Answer {missing} more to submit",
+                callback_data=self._callback("c", self.id, "submit"),
+            ),)
+            for missing in range(len(self.questions) + 1)
+        ]
+        self._compact_keyboards = {}
+        self.compact_text = (
+            f"🗳 {self.title}\n\n" + "\n".join(q.text for q in self.questions)
+            + "\nTap one option per question, then Submit."
+        )
+
+    def option(self, q_id: str, position: str):
+        # The option behind a callback position, or None if it does not exist
+        question = self.by_id.get(q_id)
+        if question is None or not position.isdigit() or int(position) >= len(question.options):
+            return None
+        return question.options[int(position)]
+
+    def compact_keyboard(self, answers) -> InlineKeyboardMarkup:
+        selection = tuple(
+            q.options.index(answers[q.id]) if q.id in answers else None
+            for q in self.questions
+        )
+        keyboard = self._compact_keyboards.get(selection)
+        if keyboard is None:
+            rows = [self._compact_rows[(q.id, selected)] for q, selected in zip(self.questions, selection)]
+            rows.append(self._submit_rows[selection.count(None)])
+            keyboard = InlineKeyboardMarkup(rows)
+            if len(self._compact_keyboards) < COMPACT_CACHE_SIZE:
+                self._compact_keyboards[selection] = keyboard
+        return keyboard
+
+    def complete(self, answers) -> bool:
+        return all(q.id in answers for q in self.questions)
+
+    def row(self, cast_at: str, user_id: str, name: str, answers):
+        return [cast_at, user_id, name] + [answers.get(q.id, "") for q in self.questions]
+
+    @staticmethod
+    def _callback(*parts):
+        data = "|".join(str(part) for part in parts)
+        if len(data.encode()) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"Callback data {data!r} is longer than {MAX_CALLBACK_BYTES} bytes")
+        return data
+
+
+def load_elections(path: str = BALLOTS_PATH):
+    # election id -> Election, in file order
+    with open(path, encoding="utf-8") as f:
+        definitions = json.load(f)["elections"]
+
+    elections = {}
+    tables = set()
+    for definition in definitions:
+        election = Election(definition)
+        if election.id in elections or election.table in tables:
+            raise ValueError(f"Election {election.id!r} reuses an election id or table")
+        elections[election.id] = election
+        tables.add(election.table)
+    if not elections:
+        raise ValueError(f"{path} defines no elections")
+    logger.info("Loaded %d election(s) from %s", len(elections), path)
+    return elections
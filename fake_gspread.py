@@ -0,0 +1,212 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from gspread.exceptions import APIError
+
+# ==========================
+# FAKE GOOGLE SHEETS BACKEND
+# ==========================
+# In-memory stand-in for the parts of gspread the bot uses, so the bot runs
+# without /etc/secrets/credentials.json. Enable it with SHEETS_BACKEND=fake.
+#
+#   FAKE_SHEETS_LATENCY          seconds added to every API call (default 0)
+#   FAKE_SHEETS_QUOTA_PER_MINUTE requests allowed per rolling minute before a
+#                                429 APIError is raised (default 0 = unlimited)
+
+FAKE_SHEETS_LATENCY = float(os.getenv("FAKE_SHEETS_LATENCY", "0"))
+FAKE_SHEETS_QUOTA_PER_MINUTE = int(os.getenv("FAKE_SHEETS_QUOTA_PER_MINUTE", "0"))
+
+# Header rows of the worksheets the bot opens; any other title starts empty
+DEFAULT_HEADERS = {
+    "pre_voting_registration": [
+        "Timestamp", "Telegram ID", "Full Name", "Address", "Mobile", "Email",
+        "Membership Status", "Attendance", "Nomination", "Nominee Names", "Declaration",
+    ],
+    "voting_records": ["Timestamp", "Telegram ID", "Name", "Q1", "Q2", "Q3", "Q4"],
+    "proxy_submissions": [
+        "Timestamp", "Telegram ID", "Member Name", "Member Lot", "Member Address",
+        "Proxy Name", "Proxy Lot", "Mobile", "Signature Date",
+    ],
+}
+
+_A1_RANGE = re.compile(r"^(?:[^!]*!)?([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _column_number(letters: str) -> int:
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord("A") + 1
+    return number
+
+
+class _QuotaResponse:
+    # Just enough of a requests.Response for gspread's APIError
+    status_code = 429
+    text = "Quota exceeded for quota metric 'Read requests' (fake backend)"
+
+    def json(self):
+        return {"error": {"code": 429, "message": self.text, "status": "RESOURCE_EXHAUSTED"}}
+
+
+class FakeClient:
+    def __init__(self, latency: float = FAKE_SHEETS_LATENCY, quota_per_minute: int = FAKE_SHEETS_QUOTA_PER_MINUTE):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = 0
+        self.quota_errors = 0
+        self._spreadsheets = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def open(self, title: str):
+        with self._lock:
+            if title not in self._spreadsheets:
+                self._spreadsheets[title] = FakeSpreadsheet(self, title)
+            return self._spreadsheets[title]
+
+    def request(self):
+        # Called at the start of every fake API call
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if not self.quota_per_minute:
+                return
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota_per_minute:
+                self.quota_errors += 1
+                raise APIError(_QuotaResponse())
+            self._recent.append(now)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: FakeClient, title: str):
+        self.client = client
+        self.title = title
+        self._worksheets = {}
+
+    def worksheet(self, title: str):
+        self.client.request()
+        if title not in self._worksheets:
+            self._worksheets[title] = FakeWorksheet(self.client, title, DEFAULT_HEADERS.get(title, []))
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.client.request()
+        return list(self._worksheets.values())
+
+
+class FakeWorksheet:
+    def __init__(self, client: FakeClient, title: str, header=None):
+        self.client = client
+        self.title = title
+        self.cells = [list(header)] if header else []
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        return len(self.cells)
+
+    # --------------------
+    # READS
+    # --------------------
+    def get_all_values(self):
+        self.client.request()
+        with self._lock:
+            return self._padded(self.cells)
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        if not values:
+            return []
+        return [dict(zip(values[0], row)) for row in values[1:]]
+
+    def get_values(self, range_name: str):
+        self.client.request()
+        with self._lock:
+            return self._read(range_name)
+
+    def batch_get(self, ranges):
+        self.client.request()
+        with self._lock:
+            return [self._read(range_name) for range_name in ranges]
+
+    # --------------------
+    # WRITES
+    # --------------------
+    def append_row(self, values):
+        return self.append_rows([values])
+
+    def append_rows(self, rows):
+        self.client.request()
+        with self._lock:
+            first_row = len(self.cells) + 1
+            self.cells.extend([str(v) for v in row] for row in rows)
+            last_row = len(self.cells)
+        width = max((len(row) for row in rows), default=1)
+        last_col = self._column_letter(width)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first_row}:{last_col}{last_row}"}}
+
+    def update(self, range_name=None, values=None):
+        self.client.request()
+        with self._lock:
+            self._write(range_name, values)
+
+    def batch_update(self, data):
+        self.client.request()
+        with self._lock:
+            for item in data:
+                self._write(item["range"], item["values"])
+
+    def delete_rows(self, start_index: int, end_index: int = None):
+        self.client.request()
+        with self._lock:
+            del self.cells[start_index - 1:(end_index or start_index)]
+
+    # --------------------
+    # RANGES
+    # --------------------
+    def _bounds(self, range_name: str):
+        match = _A1_RANGE.match(range_name)
+        if not match:
+            raise ValueError(f"Unsupported range {range_name!r}")
+        start_col, start_row, end_col, end_row = match.groups()
+        first_row = int(start_row) if start_row else 1
+        last_row = int(end_row) if end_row else (first_row if end_col is None else len(self.cells))
+        first_col = _column_number(start_col) if start_col else 1
+        last_col = _column_number(end_col) if end_col else None
+        return first_row, last_row, first_col, last_col
+
+    def _read(self, range_name: str):
+        first_row, last_row, first_col, last_col = self._bounds(range_name)
+        rows = self._padded(self.cells)[first_row - 1:last_row]
+        return [row[first_col - 1:last_col] for row in rows]
+
+    def _write(self, range_name: str, values):
+        first_row, _, first_col, _ = self._bounds(range_name)
+        for offset, row_values in enumerate(values):
+            row_number = first_row + offset
+            while len(self.cells) < row_number:
+                self.cells.append([])
+            row = self.cells[row_number - 1]
+            needed = first_col - 1 + len(row_values)
+            row.extend([""] * (needed - len(row)))
+            row[first_col - 1:needed] = [str(v) for v in row_values]
+
+    @staticmethod
+    def _padded(cells):
+        width = max((len(row) for row in cells), default=0)
+        return [list(row) + [""] * (width - len(row)) for row in cells]
+
+    @staticmethod
+    def _column_letter(n: int) -> str:
+        letters = ""
+        while n:
+            n, remainder = divmod(n - 1, 26)
+            letters = chr(ord("A") + remainder) + letters
+        return letters
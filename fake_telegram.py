@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+# ==========================
+# FAKE TELEGRAM BACKEND
+# ==========================
+# A Bot API stand-in for loadtest.py and bench.py: pass FakeTelegramRequest to
+# ApplicationBuilder().request(...) and feed the Updates built below to
+# Application.process_update. Every call succeeds after the configured latency.
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "AGHAI", "username": "aghai_loadtest_bot"}
+
+
+class FakeTelegramRequest(BaseRequest):
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = defaultdict(int)
+        self._message_ids = itertools.count(1_000_000)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            result = {
+                "message_id": int(params.get("message_id", next(self._message_ids))),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+# --------------------
+# SYNTHETIC UPDATES
+# --------------------
+
+_update_ids = itertools.count(1)
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"Voter{user_id}", "last_name": "Load"}
+
+
+def message_update(app, user_id, text):
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": next(_update_ids), "message": message}, app.bot)
+
+
+def callback_update(app, user_id, data):
+    update_id = next(_update_ids)
+    callback = {
+        "id": str(update_id),
+        "from": _user(user_id),
+        "chat_instance": str(user_id),
+        "data": data,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": BOT_USER,
+            "text": "…",
+        },
+    }
+    return Update.de_json({"update_id": update_id, "callback_query": callback}, app.bot)
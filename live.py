@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+SUBSCRIBER_QUEUE_SIZE = 256  # events held for a slow observer before it is resynced
+
+# ==========================
+# LIVE RESULTS FEED
+# ==========================
+# Turns store changes into events for the /results/stream endpoint (web.py).
+# Each observer gets a queue; a new one starts from snapshot(), then receives:
+#   ballot   {"election", "change": 1 or -1, "delta": {question: {answer: n}}, "total", "turnout"}
+#   turnout  {"registered", "turnout"}    after a registration
+#   snapshot (same as on connect)         after a clear or an import, or when
+#                                         an observer fell too far behind
+# Counts come from the running tallies, so observers never cost a Sheets read.
+
+class ResultsFeed:
+    def __init__(self, elections, tallies, store):
+        self.elections = elections
+        self.tallies = tallies
+        self.store = store
+        self.by_table = {election.table: election for election in elections.values()}
+        self.registered = 0
+        self.subscribers = set()
+
+    def attach(self):
+        # After the tallies, so their counts already include the change
+        self.registered = self.store.count("registrations")
+        self.store.subscribe(self.on_change)
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    # --------------------
+    # OBSERVERS
+    # --------------------
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def snapshot(self):
+        return {
+            "registered": self.registered,
+            "turnout": self.turnout(),
+            "elections": {
+                election.id: {
+                    "title": election.title,
+                    "total": self.tallies[election.id].total,
+                    "counts": {q: dict(counts) for q, counts in self.tallies[election.id].counts.items()},
+                }
+                for election in self.elections.values()
+            },
+        }
+
+    def turnout(self):
+        # election id -> share of registered members who have voted
+        return {
+            election_id: round(tally.total / self.registered, 4) if self.registered else 0.0
+            for election_id, tally in self.tallies.items()
+        }
+
+    # --------------------
+    # STORE CHANGES
+    # --------------------
+    def on_change(self, table, op, key, values):
+        if table == "registrations":
+            if op in ("insert", "delete"):
+                self.registered += 1 if op == "insert" else -1
+            else:
+                self.registered = self.store.count("registrations")
+            self.publish("turnout", {"registered": self.registered, "turnout": self.turnout()})
+            return
+
+        election = self.by_table.get(table)
+        if election is None:
+            return
+        if op not in ("insert", "delete"):
+            self.publish("snapshot", self.snapshot())
+            return
+
+        change = 1 if op == "insert" else -1
+        ballot = dict(zip(self.store.columns[table], values))
+        self.publish("ballot", {
+            "election": election.id,
+            "change": change,
+            "delta": {q: {ballot[q]: change} for q in election.options if ballot.get(q)},
+            "total": self.tallies[election.id].total,
+            "turnout": self.turnout()[election.id],
+        })
+
+    def publish(self, event: str, data):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Drop what it has not read and start it over from a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("snapshot", self.snapshot()))
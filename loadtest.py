@@ -0,0 +1,184 @@
+"""Drive simulated voters through the real Application against fake backends.
+
+    python loadtest.py --users 2000 --concurrency 200 --sheets-latency 0.3
+
+Every user goes start -> prevote form -> begin -> ballot -> revote -> ballot,
+where a ballot is q1..q4 (+ submit in the compact BALLOT_MODE).
+Synthetic Updates are fed to Application.process_update; Telegram API calls
+are answered by a local fake request, and Google Sheets by fake_gspread.
+Prints per-step p50/p95/p99 latency and overall throughput.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="users in flight at once")
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="seconds per fake Sheets call")
+    parser.add_argument("--sheets-quota", type=int, default=300, help="fake Sheets requests per minute (0 = unlimited)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="seconds per fake Telegram API call")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    return parser.parse_args()
+
+
+args = parse_args()
+
+# The bot reads these at import time
+os.environ["SHEETS_BACKEND"] = "fake"
+os.environ["FAKE_SHEETS_LATENCY"] = str(args.sheets_latency)
+os.environ["FAKE_SHEETS_QUOTA_PER_MINUTE"] = str(args.sheets_quota)
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+WORK_DIR = tempfile.mkdtemp(prefix="aghai-loadtest-")
+os.environ["DB_PATH"] = os.path.join(WORK_DIR, "loadtest.db")
+os.environ["AUDIT_PATH"] = os.path.join(WORK_DIR, "loadtest_audit.log")
+os.environ["ROSTER_PATH"] = os.path.join(WORK_DIR, "roster.csv")
+
+from telegram.ext import ApplicationBuilder  # noqa: E402
+
+import bot  # noqa: E402
+from fake_telegram import FakeTelegramRequest, callback_update, message_update  # noqa: E402
+
+# Alternate between the options of each question of the default election
+ELECTION = bot.DEFAULT_ELECTION
+ANSWERS = [(q.id, n % len(q.options)) for n, q in enumerate(ELECTION.questions)]
+if bot.BALLOT_MODE == "compact":
+    BALLOT = [(q, f"c|{ELECTION.id}|{q}|{n}") for q, n in ANSWERS] + [("submit", f"c|{ELECTION.id}|submit")]
+else:
+    BALLOT = [(q, f"a|{ELECTION.id}|{q}|{n}") for q, n in ANSWERS]
+
+
+def voter_script(user_id):
+    # (step label, "message" | "callback", payload)
+    return [
+        ("start", "message", "/start"),
+        ("prevote", "callback", "prevote"),
+        ("full_name", "message", f"Voter {user_id}"),
+        ("address", "message", f"Lot {user_id % 40 + 1} Block {user_id % 17 + 1}"),
+        ("mobile", "message", "09170000000"),
+        ("email", "message", f"voter{user_id}@example.com"),
+        ("membership_status", "callback", "Registered Owner"),
+        ("attendance", "callback", "Yes"),
+        ("nomination", "callback", "nom_no"),
+        ("declaration", "callback", "Agree"),
+        ("begin", "callback", ELECTION.begin_data),
+        *[(label, "callback", data) for label, data in BALLOT],
+        ("revote", "callback", ELECTION.revote_data),
+        ("begin", "callback", ELECTION.begin_data),
+        *[(label, "callback", data) for label, data in BALLOT],
+    ]
+
+
+# ==========================
+# RUN
+# ==========================
+
+async def run_voter(app, user_id, latencies):
+    for label, kind, payload in voter_script(user_id):
+        if kind == "message":
+            update = message_update(app, user_id, payload)
+        else:
+            update = callback_update(app, user_id, payload)
+        started = time.perf_counter()
+        await app.process_update(update)
+        latencies[label].append(time.perf_counter() - started)
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+async def main():
+    # Keep the deadline check from closing voting during the run
+    bot.VOTING_DEADLINE = datetime.max
+
+    request = FakeTelegramRequest(args.telegram_latency)
+    builder = ApplicationBuilder().token(os.environ["BOT_TOKEN"]).request(request).get_updates_request(
+        FakeTelegramRequest(0)
+    )
+    app = bot.build_application(builder)
+
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(repr(context.error))
+
+    app.add_error_handler(count_error)
+
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(user_id):
+        async with semaphore:
+            await run_voter(app, user_id, latencies)
+
+    async with app:
+        await bot.post_init(app)
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(10_000_000 + n) for n in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        await bot.sheet_writer.drain(timeout=600)
+        drain_elapsed = time.perf_counter() - drain_started
+    # Once the application has shut down and flushed its persistence
+    await bot.post_shutdown(app)
+
+    updates = sum(len(samples) for samples in latencies.values())
+    report = {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "updates": updates,
+        "elapsed_seconds": round(elapsed, 3),
+        "updates_per_second": round(updates / elapsed, 1),
+        "ballots_per_second": round(args.users * 2 / elapsed, 1),
+        "sheet_drain_seconds": round(drain_elapsed, 3),
+        "handler_errors": len(errors),
+        "sheets_calls": bot.workbook.client.calls,
+        "sheets_quota_errors": bot.workbook.client.quota_errors,
+        "telegram_calls": dict(request.calls),
+        "steps": {},
+    }
+    for label, samples in latencies.items():
+        p50, p95, p99 = percentiles(samples)
+        report["steps"][label] = {
+            "count": len(samples),
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+        }
+
+    print(f"{'step':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, stats in report["steps"].items():
+        print(f"{label:<20}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print()
+    print(f"{updates} updates in {elapsed:.2f}s = {report['updates_per_second']} updates/s")
+    print(f"Sheets: {report['sheets_calls']} calls, {report['sheets_quota_errors']} quota errors, "
+          f"mirror drained in {drain_elapsed:.2f}s")
+    print(f"Handler errors: {len(errors)}")
+    for error in sorted(set(errors))[:5]:
+        print(f"  {error}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,249 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_BLOCK = re.compile(r"\b(?:block|blk|bk|b)\s*\.?\s*(?:no\.?\s*)?(\d+)")
+_LOT = re.compile(r"\b(?:lot|lt|l)\s*\.?\s*(?:no\.?\s*)?(\d+)")
+_PHASE = re.compile(r"\b(?:phase|ph|p)\s*\.?\s*(\d+)")
+
+
+def normalize_lot(text) -> str:
+    # "Lot 12 Block 3", "Blk. 3 L12", "B3-L12" -> "B3-L12"; "" if there is nothing to key on
+    text = str(text or "").lower()
+    block = _BLOCK.search(text)
+    lot = _LOT.search(text)
+    if block and lot:
+        phase = _PHASE.search(text)
+        key = f"B{int(block.group(1))}-L{int(lot.group(1))}"
+        return f"P{int(phase.group(1))}-{key}" if phase else key
+    # Not in block/lot form: compare on letters and digits only
+    return re.sub(r"[^a-z0-9]", "", text).upper()
+
+
+# ==========================
+# LOT INDEX
+# ==========================
+# Maps members to normalized lot keys, from the address given at prevote
+# registration, and proxies to the lot they represent and the proxy holder's
+# lot (tables member_lots and proxy_lots, indexed on the lot keys). Subscribed
+# to the store, it follows every registration and proxy.
+#
+# Rules:
+#   - one ballot per lot per election: a member cannot vote if another member
+#     with the same lot already has;
+#   - a proxy holder's ballot also counts for every lot that named the
+#     holder's lot as its proxy, unless that lot has voted directly (a direct
+#     ballot overrides the proxy);
+#   - a lot is counted once: if it filed several proxies the earliest one
+#     decides, and if several members of that lot voted the earliest ballot
+#     holds the proxy.
+
+class LotIndex:
+    def __init__(self, store):
+        self.store = store
+        self.conn = store.conn
+
+    def attach(self):
+        self.store.subscribe(self.on_change)
+        self.rebuild()
+
+    # --------------------
+    # MAINTENANCE
+    # --------------------
+    def rebuild(self, table: str = None):
+        with self.conn:
+            if table in (None, "registrations"):
+                self.conn.execute("DELETE FROM member_lots")
+                self.conn.executemany(
+                    "INSERT INTO member_lots (telegram_id, lot_key) VALUES (?, ?)",
+                    [
+                        (telegram_id, normalize_lot(address))
+                        for telegram_id, address in self.conn.execute("SELECT telegram_id, address FROM registrations")
+                    ],
+                )
+            if table in (None, "proxies"):
+                self.conn.execute("DELETE FROM proxy_lots")
+                self.conn.executemany(
+                    "INSERT INTO proxy_lots (telegram_id, member_lot_key, proxy_lot_key) VALUES (?, ?, ?)",
+                    [
+                        (telegram_id, normalize_lot(member_lot), normalize_lot(proxy_lot))
+                        for telegram_id, member_lot, proxy_lot in self.conn.execute(
+                            "SELECT telegram_id, member_lot, proxy_lot FROM proxies ORDER BY rowid"
+                        )
+                    ],
+                )
+        logger.info("Lot index rebuilt (%s)", table or "all")
+
+    def on_change(self, table, op, key, values):
+        if table not in ("registrations", "proxies"):
+            return
+        if op in ("import", "clear"):
+            self.rebuild(table)
+            return
+
+        record = dict(zip(self.store.columns[table], values or []))
+        with self.conn:
+            if table == "registrations":
+                self.conn.execute("DELETE FROM member_lots WHERE telegram_id = ?", (key,))
+                if op == "insert":
+                    self.conn.execute(
+                        "INSERT INTO member_lots (telegram_id, lot_key) VALUES (?, ?)",
+                        (key, normalize_lot(record["address"])),
+                    )
+            else:
+                self.conn.execute("DELETE FROM proxy_lots WHERE telegram_id = ?", (key,))
+                if op == "insert":
+                    self.conn.execute(
+                        "INSERT INTO proxy_lots (telegram_id, member_lot_key, proxy_lot_key) VALUES (?, ?, ?)",
+                        (key, normalize_lot(record["member_lot"]), normalize_lot(record["proxy_lot"])),
+                    )
+
+    # --------------------
+    # LOOKUPS
+    # --------------------
+    def lot_of(self, user_id):
+        row = self.conn.execute("SELECT lot_key FROM member_lots WHERE telegram_id = ?", (str(user_id),)).fetchone()
+        return row[0] if row and row[0] else None
+
+    def lot_ballot(self, ballot_table: str, user_id):
+        # Another member's ballot already cast for this member's lot, if any
+        row = self.conn.execute(
+            f"SELECT b.telegram_id, b.name, me.lot_key FROM member_lots me "
+            f"JOIN member_lots other ON other.lot_key = me.lot_key AND other.telegram_id != me.telegram_id "
+            f"JOIN {ballot_table} b ON b.telegram_id = other.telegram_id "
+            f"WHERE me.telegram_id = ? AND me.lot_key != '' LIMIT 1",
+            (str(user_id),),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def proxied_lots(self, ballot_table: str, user_id):
+        # Lots this member's ballot also counts for
+        return [
+            row["lot_key"] for row in self.conn.execute(
+                self._PROXIED.format(table=ballot_table, where="") + " AND holder_id = ? ORDER BY lot_key",
+                (str(user_id),),
+            )
+        ]
+
+    def proxy_holders(self, ballot_table: str, lot_key: str = None):
+        # proxied lot -> the ballot holder it counts for; one lot, or all of them
+        where, params = ("AND p.member_lot_key = ?", (lot_key,)) if lot_key is not None else ("", ())
+        return {
+            row["lot_key"]: row["holder_id"]
+            for row in self.conn.execute(self._PROXIED.format(table=ballot_table, where=where), params)
+        }
+
+    def lots_proxied_to(self, lot_key: str):
+        # Lots that named this lot as their proxy
+        return [
+            row[0] for row in self.conn.execute(
+                "SELECT DISTINCT member_lot_key FROM proxy_lots WHERE proxy_lot_key = ?", (lot_key,)
+            )
+        ]
+
+    # (proxied lot, holder) pairs, one per lot: the lot's earliest proxy names
+    # the holder's lot, the earliest ballot from that lot holds it, and the
+    # proxied lot has not voted itself
+    _PROXIED = (
+        "SELECT lot_key, holder_id FROM ("
+        "SELECT p.member_lot_key AS lot_key, holder.telegram_id AS holder_id, "
+        "ROW_NUMBER() OVER (PARTITION BY p.member_lot_key ORDER BY hb.rowid) AS pick "
+        "FROM proxy_lots p "
+        "JOIN member_lots holder ON holder.lot_key = p.proxy_lot_key "
+        "JOIN {table} hb ON hb.telegram_id = holder.telegram_id "
+        "WHERE p.member_lot_key != '' AND p.proxy_lot_key != '' AND p.member_lot_key != p.proxy_lot_key "
+        "AND p.rowid = ("
+        "SELECT MIN(first.rowid) FROM proxy_lots first WHERE first.member_lot_key = p.member_lot_key "
+        "AND first.proxy_lot_key != '' AND first.proxy_lot_key != first.member_lot_key) "
+        "AND NOT EXISTS ("
+        "SELECT 1 FROM member_lots voter JOIN {table} vb ON vb.telegram_id = voter.telegram_id "
+        "WHERE voter.lot_key = p.member_lot_key) "
+        "{where}"
+        ") WHERE pick = 1"
+    )
+
+
+# ==========================
+# LOT TALLY
+# ==========================
+# Ballots weighted by the lots they represent (own ballot + proxied lots), kept
+# in step with the store like tally.Tally, so /results never recounts. Each
+# proxied lot remembers its holder and the answers it was counted with; a
+# change only re-resolves the lots it can affect: a ballot or registration
+# touches its member's lot and the lots proxied to it, a proxy its own lot.
+# Attach after the LotIndex, so member_lots and proxy_lots are already current.
+
+class LotTally:
+    def __init__(self, lot_index, options, table: str = "ballots"):
+        self.lots = lot_index
+        self.options = options
+        self.table = table
+        self.counts = {}
+        self.total = 0
+        self.proxied = {}  # proxied lot -> (holder id, answers counted)
+        self.reset()
+
+    def reset(self):
+        self.counts = {q: {opt: 0 for opt in opts} for q, opts in self.options.items()}
+        self.total = 0
+        self.proxied = {}
+
+    def rebuild(self, store):
+        self.reset()
+        for q in self.options:
+            for answer, votes in store.conn.execute(f"SELECT {q}, COUNT(*) FROM {self.table} GROUP BY {q}"):
+                if answer in self.counts[q]:
+                    self.counts[q][answer] = votes
+        self.total = store.count(self.table)
+        for lot_key, holder_id in self.lots.proxy_holders(self.table).items():
+            self._set_holder(store, lot_key, holder_id)
+        logger.info("Lot tally for %s rebuilt: %d lots represented", self.table, self.total)
+
+    def add(self, answers, weight: int = 1):
+        for q, counts in self.counts.items():
+            if answers.get(q) in counts:
+                counts[answers[q]] += weight
+        self.total += weight
+
+    def on_change(self, store, table, op, key, values):
+        if table not in (self.table, "registrations", "proxies"):
+            return
+        if op in ("import", "clear"):
+            self.rebuild(store)
+            return
+
+        record = dict(zip(store.columns[table], values or []))
+        if table == self.table:
+            self.add(record, weight=1 if op == "insert" else -1)
+            lot_key = self.lots.lot_of(key)
+        elif table == "registrations":
+            lot_key = normalize_lot(record.get("address"))
+        else:
+            self._resolve(store, normalize_lot(record.get("member_lot")))
+            return
+        if lot_key:
+            for affected in (lot_key, *self.lots.lots_proxied_to(lot_key)):
+                self._resolve(store, affected)
+
+    def _resolve(self, store, lot_key):
+        if not lot_key:
+            return
+        holder_id = self.lots.proxy_holders(self.table, lot_key).get(lot_key)
+        current = self.proxied.get(lot_key)
+        if current is not None and current[0] == holder_id:
+            return
+        if current is not None:
+            self.add(current[1], weight=-1)
+            del self.proxied[lot_key]
+        if holder_id is not None:
+            self._set_holder(store, lot_key, holder_id)
+
+    def _set_holder(self, store, lot_key, holder_id):
+        answers = store.get(self.table, holder_id) or {}
+        self.proxied[lot_key] = (holder_id, answers)
+        self.add(answers)
+
+    def attach(self, store):
+        store.subscribe(lambda table, op, key, values: self.on_change(store, table, op, key, values))
+        self.rebuild(store)
@@ -0,0 +1,158 @@
+import functools
+import inspect
+import time
+
+from gspread.exceptions import APIError
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+
+# ==========================
+# METRICS
+# ==========================
+# Prometheus metrics served on /metrics by the web server in main().
+
+HANDLER_LATENCY = Histogram(
+    "aghai_handler_seconds", "Time spent in each bot handler", ["handler"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SHEETS_CALLS = Counter("aghai_sheets_calls_total", "Google Sheets API calls", ["operation", "worksheet"])
+SHEETS_QUOTA_ERRORS = Counter("aghai_sheets_quota_errors_total", "Sheets calls rejected with HTTP 429", ["worksheet"])
+SHEETS_QUOTA_RETRIES = Counter("aghai_sheets_quota_retries_total", "Sheets calls retried after HTTP 429", ["kind"])
+SHEETS_COALESCED = Counter("aghai_sheets_coalesced_total", "Sheets reads served by an identical request already in flight")
+TELEGRAM_LATENCY = Histogram(
+    "aghai_telegram_api_seconds", "Telegram Bot API call latency", ["method"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ACTIVE_CONVERSATIONS = Gauge("aghai_active_conversations", "Conversations in progress per state", ["conversation", "state"])
+BALLOTS_RECORDED = Counter("aghai_ballots_recorded_total", "Ballots recorded")
+BROADCAST_MESSAGES = Counter("aghai_broadcast_messages_total", "Broadcast messages by outcome", ["status"])
+SHEETS_QUEUE_DEPTH = Gauge("aghai_sheets_queue_depth", "Changes waiting to be written to Google Sheets")
+SESSIONS = Gauge("aghai_sessions", "Member sessions held in memory")
+SESSION_BYTES = Gauge("aghai_session_bytes", "Approximate memory used by member sessions")
+SESSIONS_EVICTED = Gauge("aghai_sessions_evicted", "Sessions evicted for being idle or over the cap since start")
+
+_conversations = {}
+
+
+# --------------------
+# HANDLERS
+# --------------------
+def timed(callback, name=None):
+    name = name or getattr(callback, "__name__", "handler")
+    if name == "<lambda>":
+        name = "cancel"
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            result = callback(update, context)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def instrument_handlers(application):
+    # Wrap the callback of every registered handler, including those inside
+    # ConversationHandlers, in a latency timer
+    def instrument(handler):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                instrument(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    instrument(inner)
+        else:
+            handler.callback = timed(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument(handler)
+
+
+def track_conversations(**conversations):
+    _conversations.update(conversations)
+
+
+def _update_conversation_gauges():
+    ACTIVE_CONVERSATIONS.clear()
+    for conversation_name, conversation in _conversations.items():
+        # Name each state after the handler that will receive the next input
+        state_names = {
+            state: handlers[0].callback.__name__ if handlers else str(state)
+            for state, handlers in conversation.states.items()
+        }
+        counts = {name: 0 for name in state_names.values()}
+        for state in list(conversation._conversations.values()):
+            if state in state_names:
+                counts[state_names[state]] += 1
+        for state_name, count in counts.items():
+            ACTIVE_CONVERSATIONS.labels(conversation_name, state_name).set(count)
+
+
+# --------------------
+# GOOGLE SHEETS
+# --------------------
+class InstrumentedWorksheet:
+    # Wraps a gspread Worksheet and counts each API method called on it
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def __getattr__(self, name):
+        attribute = getattr(self._worksheet, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        title = self._worksheet.title
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            SHEETS_CALLS.labels(name, title).inc()
+            try:
+                return attribute(*args, **kwargs)
+            except APIError as error:
+                if getattr(error, "code", None) == 429:
+                    SHEETS_QUOTA_ERRORS.labels(title).inc()
+                raise
+
+        return call
+
+
+# --------------------
+# TELEGRAM
+# --------------------
+class InstrumentedRequest(HTTPXRequest):
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+        finally:
+            TELEGRAM_LATENCY.labels(url.rsplit("/", 1)[-1]).observe(time.perf_counter() - started)
+
+
+# --------------------
+# STORE AND QUEUE
+# --------------------
+def watch_store(store, sheet_writer, ballot_tables=("ballots",)):
+    def on_change(table, op, key, values):
+        if table in ballot_tables and op == "insert":
+            BALLOTS_RECORDED.inc()
+
+    store.subscribe(on_change)
+    SHEETS_QUEUE_DEPTH.set_function(lambda: sheet_writer.backlog)
+
+
+def watch_sessions(application, tracker):
+    SESSIONS.set_function(lambda: len(application.user_data))
+    SESSION_BYTES.set_function(lambda: tracker.memory(application.user_data)[1])
+    SESSIONS_EVICTED.set_function(lambda: tracker.evicted)
+
+
+def render():
+    _update_conversation_gauges()
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import os
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from sessions import Session
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+PERSISTENCE_INTERVAL_SECONDS = float(os.getenv("PERSISTENCE_INTERVAL", "5"))
+COMMIT_DELAY_SECONDS = 0.1  # collects one persistence round into one transaction
+
+# ==========================
+# CONVERSATION PERSISTENCE
+# ==========================
+# Keeps ConversationHandler states and user_data in the Store's SQLite file
+# (tables conversations and user_data), so a restart resumes members in the
+# middle of the prevote and proxy forms. user_data values are sessions.Session,
+# stored as the JSON of Session.to_dict().
+# The Application already debounces: every PERSISTENCE_INTERVAL it hands over
+# only the users and conversations that changed. Those calls are staged here,
+# latest value per key, and committed together in one transaction. Rows are
+# per member, so nothing is rewritten for members who did not change.
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, store, update_interval: float = PERSISTENCE_INTERVAL_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.conn = store.conn
+        self._staged = {}
+        self._commit_task = None
+
+    # --------------------
+    # LOAD
+    # --------------------
+    async def get_user_data(self):
+        return {
+            int(user_id): Session.from_dict(json.loads(data))
+            for user_id, data in self.conn.execute("SELECT user_id, data FROM user_data")
+        }
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {
+            tuple(json.loads(key)): json.loads(state)
+            for key, state in self.conn.execute("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        }
+
+    # --------------------
+    # SAVE
+    # --------------------
+    async def update_conversation(self, name, key, new_state):
+        key = json.dumps(list(key))
+        if new_state is None:
+            self._stage(("conversation", name, key), "DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+        else:
+            self._stage(
+                ("conversation", name, key),
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                (name, key, json.dumps(new_state)),
+            )
+
+    async def update_user_data(self, user_id, data):
+        if data:
+            self._stage(
+                ("user", user_id),
+                "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                (user_id, json.dumps(data.to_dict(), separators=(",", ":"))),
+            )
+        else:
+            await self.drop_user_data(user_id)
+
+    async def drop_user_data(self, user_id):
+        self._stage(("user", user_id), "DELETE FROM user_data WHERE user_id = ?", (user_id,))
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._commit_task:
+            self._commit_task.cancel()
+            self._commit_task = None
+        self._commit()
+
+    # --------------------
+    # BATCHING
+    # --------------------
+    def _stage(self, key, sql, params):
+        self._staged[key] = (sql, params)
+        if self._commit_task is None:
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_soon())
+
+    async def _commit_soon(self):
+        await asyncio.sleep(COMMIT_DELAY_SECONDS)
+        self._commit_task = None
+        self._commit()
+
+    def _commit(self):
+        if not self._staged:
+            return
+        staged, self._staged = self._staged, {}
+        try:
+            with self.conn:
+                for sql, params in staged.values():
+                    self.conn.execute(sql, params)
+        except Exception:
+            # Put them back unless a newer value was staged meanwhile
+            for key, write in staged.items():
+                self._staged.setdefault(key, write)
+            logger.exception("Could not save %d conversation changes; retrying next round", len(staged))
@@ -0,0 +1,171 @@
+import csv
+import io
+import logging
+import os
+import re
+from collections import Counter
+
+from lots import normalize_lot
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+ROSTER_PATH = os.getenv("ROSTER_PATH", "roster.csv")
+NAME_MATCH_THRESHOLD = 0.6  # Dice similarity of name trigrams
+NAME_ACCEPT_THRESHOLD = 0.75  # close enough to take the roster's spelling
+NAME_MARGIN = 0.1  # lead over the next match needed to pick one name
+
+_NAME_COLUMNS = ("name", "full_name", "member", "member_name")
+_LOT_COLUMNS = ("lot", "lot_no", "address")
+
+# ==========================
+# MEMBER ROSTER
+# ==========================
+# The association's list of lots and the members on each, loaded from a CSV
+# with a name column and a lot column (or separate block and lot columns).
+# Built into two indexes:
+#   - normalized lot key -> members on that lot;
+#   - name trigram -> members whose name contains it, for fuzzy matching.
+# Names are compared lowercased, without punctuation and with their words
+# sorted, so "Dela Cruz, Juan" and "juan dela cruz" are the same name.
+# An empty roster (no file yet) accepts everything, as before it existed.
+
+
+def normalize_name(text) -> str:
+    return " ".join(sorted(re.findall(r"[a-z0-9]+", str(text or "").lower())))
+
+
+def trigrams(name: str):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Member:
+    __slots__ = ("name", "lot", "lot_key", "key", "grams")
+
+    def __init__(self, name: str, lot: str):
+        self.name = name.strip()
+        self.lot = lot.strip()
+        self.lot_key = normalize_lot(lot)
+        self.key = normalize_name(name)
+        self.grams = trigrams(self.key)
+
+
+class Roster:
+    def __init__(self):
+        self.members = []
+        self.by_lot = {}
+        self.by_gram = {}
+        self.source = None
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def lots(self) -> int:
+        return len(self.by_lot)
+
+    # --------------------
+    # LOADING
+    # --------------------
+    def load(self, path: str = ROSTER_PATH) -> int:
+        if not os.path.exists(path):
+            logger.info("No roster at %s; registrations are not checked against one", path)
+            return 0
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            count = self.load_csv(f.read())
+        self.source = path
+        return count
+
+    def load_csv(self, text: str) -> int:
+        # Raises ValueError if the columns are missing; the current roster stays
+        members = parse_csv(text)
+        by_lot, by_gram = {}, {}
+        for number, member in enumerate(members):
+            by_lot.setdefault(member.lot_key, []).append(member)
+            for gram in member.grams:
+                by_gram.setdefault(gram, []).append(number)
+        self.members, self.by_lot, self.by_gram = members, by_lot, by_gram
+        logger.info("Roster loaded: %d members on %d lots", len(members), len(by_lot))
+        return len(members)
+
+    # --------------------
+    # LOOKUPS
+    # --------------------
+    def has_lot(self, lot) -> bool:
+        return not self.members or normalize_lot(lot) in self.by_lot
+
+    def match_names(self, name, limit: int = 3, members=None):
+        # (member, score) best first, for scores at or above NAME_MATCH_THRESHOLD
+        key = normalize_name(name)
+        grams = trigrams(key)
+        if not key or not grams:
+            return []
+        if members is None:
+            # Count shared trigrams only for members that share at least one
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.by_gram.get(gram, ()))
+            scored = [(self.members[number], 2 * count / (len(grams) + len(self.members[number].grams)))
+                      for number, count in shared.items()]
+        else:
+            scored = [(member, 2 * len(grams & member.grams) / (len(grams) + len(member.grams))) for member in members]
+        scored = [(member, 1.0 if member.key == key else score) for member, score in scored]
+        scored = [item for item in scored if item[1] >= NAME_MATCH_THRESHOLD]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def check_member(self, name, lot):
+        # (ok, roster spelling of the name or None, message for the member)
+        if not self.members:
+            return True, None, ""
+        lot_key = normalize_lot(lot)
+        on_lot = self.by_lot.get(lot_key)
+        if not on_lot:
+            return False, None, f"Lot {lot_key or lot!r} is not on the association roster."
+        matches = self.match_names(name, members=on_lot)
+        if matches and matches[0][1] >= NAME_ACCEPT_THRESHOLD:
+            return True, matches[0][0].name, ""
+        message = f"{name!r} is not listed as a member for lot {lot_key}."
+        if matches:
+            message += f" Did you mean {matches[0][0].name}?"
+        return False, None, message
+
+    def resolve_names(self, text):
+        # Comma-separated names -> (roster spellings, names not found)
+        found, unknown = [], []
+        for name in (part.strip() for part in str(text or "").split(",")):
+            if not name:
+                continue
+            if not self.members:
+                found.append(name)
+                continue
+            matches = self.match_names(name, limit=2)
+            unambiguous = len(matches) < 2 or matches[0][1] - matches[1][1] >= NAME_MARGIN
+            if matches and matches[0][1] >= NAME_ACCEPT_THRESHOLD and unambiguous:
+                found.append(matches[0][0].name)
+            else:
+                unknown.append(name)
+        return found, unknown
+
+
+def parse_csv(text: str):
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {column.strip().lower(): column for column in reader.fieldnames or []}
+    name_column = next((columns[c] for c in _NAME_COLUMNS if c in columns), None)
+    lot_column = next((columns[c] for c in _LOT_COLUMNS if c in columns), None)
+    block_column = columns.get("block")
+    if name_column is None or lot_column is None:
+        raise ValueError(f"The roster needs a name column ({', '.join(_NAME_COLUMNS)}) and a lot column ({', '.join(_LOT_COLUMNS)})")
+
+    members = []
+    for row in reader:
+        name, lot = row.get(name_column) or "", row.get(lot_column) or ""
+        if block_column and row.get(block_column):
+            lot = f"Block {row[block_column]} Lot {lot}"
+        if name.strip() and lot.strip():
+            members.append(Member(name, lot))
+    return members
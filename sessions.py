@@ -0,0 +1,201 @@
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+SESSION_IDLE_SECONDS = int(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "5000"))
+SESSION_SWEEP_SECONDS = 60
+
+# ==========================
+# SESSION STATE
+# ==========================
+# context.user_data is a Session (set through ContextTypes in bot.py): one
+# slot per flow, each holding a small slotted form or None. A member who is
+# not in the middle of anything has an empty Session, which persistence drops.
+
+
+class _Form:
+    __slots__ = ()
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def complete(self) -> bool:
+        return all(getattr(self, name) is not None for name in self.__slots__)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        form = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(form, name, data[name])
+        return form
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sum(_nbytes(getattr(self, name)) for name in self.__slots__)
+
+
+class BallotForm(_Form):
+    # A ballot being filled in; key makes its submission idempotent
+    __slots__ = ("election", "key", "answers")
+
+    def __init__(self, election: str = None, key: str = None):
+        super().__init__()
+        self.election = election
+        self.key = key
+        self.answers = {}
+
+
+class PrevoteForm(_Form):
+    __slots__ = (
+        "full_name", "address", "mobile", "email", "membership_status",
+        "attendance", "nomination", "nominee_names", "declaration",
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.nomination = "No"
+        self.nominee_names = ""
+
+
+class ProxyForm(_Form):
+    __slots__ = ("member_name", "member_lot", "member_address", "proxy_name", "proxy_lot", "mobile", "date")
+
+
+class Session:
+    __slots__ = ("ballot", "prevote", "proxy", "touched")
+
+    def __init__(self):
+        self.ballot = None
+        self.prevote = None
+        self.proxy = None
+        self.touched = time.time()
+
+    def __bool__(self):
+        return self.ballot is not None or self.prevote is not None or self.proxy is not None
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sum(
+            form.nbytes() for form in (self.ballot, self.prevote, self.proxy) if form is not None
+        )
+
+    def to_dict(self):
+        data = {"touched": self.touched}
+        for name, form in (("ballot", self.ballot), ("prevote", self.prevote), ("proxy", self.proxy)):
+            if form is not None:
+                data[name] = form.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls()
+        session.touched = data.get("touched", session.touched)
+        if "ballot" in data:
+            session.ballot = BallotForm.from_dict(data["ballot"])
+        if "prevote" in data:
+            session.prevote = PrevoteForm.from_dict(data["prevote"])
+        if "proxy" in data:
+            session.proxy = ProxyForm.from_dict(data["proxy"])
+        if "touched" not in data:
+            _load_flat(session, data)
+        return session
+
+
+# user_data keys saved before sessions were typed
+_FLAT_KEYS = {
+    "prevote": (PrevoteForm, {
+        "full_name": "full_name", "address": "address", "mobile": "mobile", "email": "email",
+        "membership_status": "membership_status", "attendance": "attendance",
+        "nomination_yes_no": "nomination", "nominee_names": "nominee_names",
+        "declaration_confirmed": "declaration",
+    }),
+    "proxy": (ProxyForm, {
+        "proxy_member_name": "member_name", "proxy_member_lot": "member_lot",
+        "proxy_member_address": "member_address", "proxy_name": "proxy_name",
+        "proxy_lot": "proxy_lot", "proxy_mobile": "mobile", "proxy_date": "date",
+    }),
+}
+
+
+def _load_flat(session, data):
+    if "ballot_key" in data:
+        session.ballot = BallotForm(data.get("ballot_election"), data["ballot_key"])
+        session.ballot.answers = dict(data.get("voting_answers") or {})
+    for slot, (form_type, keys) in _FLAT_KEYS.items():
+        if any(key in data for key in keys):
+            setattr(session, slot, form_type.from_dict({name: data[key] for key, name in keys.items() if key in data}))
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(k) + _nbytes(v) for k, v in value.items())
+    return sys.getsizeof(value) if value is not None else 0
+
+
+# ==========================
+# EVICTION
+# ==========================
+# Least-recently-active order of members with a session. sweep() drops the
+# sessions of members idle longer than SESSION_IDLE_SECONDS, then the oldest
+# ones while more than SESSION_MAX_ACTIVE remain. An evicted member who comes
+# back mid-form is asked to start that form again.
+
+class SessionTracker:
+    def __init__(self, idle_seconds: int = SESSION_IDLE_SECONDS, max_active: int = SESSION_MAX_ACTIVE):
+        self.idle_seconds = idle_seconds
+        self.max_active = max_active
+        self.last_seen = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def touch(self, user_id, session=None):
+        now = time.time()
+        self.last_seen[user_id] = now
+        self.last_seen.move_to_end(user_id)
+        if session is not None:
+            session.touched = now
+
+    def seed(self, user_data):
+        # Sessions loaded from persistence at startup
+        for user_id, session in sorted(user_data.items(), key=lambda item: item[1].touched):
+            self.last_seen[user_id] = session.touched
+
+    def sweep(self, application) -> int:
+        now = time.time()
+        evicted = 0
+        while self.last_seen:
+            user_id, seen = next(iter(self.last_seen.items()))
+            if now - seen < self.idle_seconds and len(self.last_seen) <= self.max_active:
+                break
+            del self.last_seen[user_id]
+            application.drop_user_data(user_id)
+            evicted += 1
+        # Members with nothing in progress need no session
+        for user_id, session in list(application.user_data.items()):
+            if not session:
+                application.drop_user_data(user_id)
+                self.last_seen.pop(user_id, None)
+        if evicted:
+            self.evicted += evicted
+            logger.info("Evicted %d idle sessions; %d remain", evicted, len(self.last_seen))
+        return evicted
+
+    @staticmethod
+    def memory(user_data):
+        # (sessions held, approximate bytes they use)
+        sessions = list(user_data.values())
+        return len(sessions), sum(session.nbytes() for session in sessions)
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from gspread.utils import rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMN = "Telegram ID"
+TAIL_ROWS = 5  # rows before the watermark checked on every refresh
+FULL_RELOAD_SECONDS = float(os.getenv("SHEET_FULL_RELOAD_SECONDS", "1800"))
+
+# "'voting_records'!A12:G12" -> 12
+_UPDATED_RANGE_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+def column_letter(n: int) -> str:
+    return rowcol_to_a1(1, n)[:-1]
+
+
+# ==========================
+# SHEET INDEX
+# ==========================
+# Keeps a Telegram ID -> (sheet row number, row data) map for one worksheet so
+# eligibility checks never download the sheet. The sheet is read once; after
+# that the index keeps a watermark: the number of rows it has (next_row) and
+# the last TAIL_ROWS rows as it believes they read. A refresh is one
+# batch_get of the tail plus everything below the watermark. If the tail no
+# longer matches its checksum, rows were edited or deleted by hand and the
+# sheet is read in full again; otherwise only the new rows are added. Edits
+# further up are picked up by a full reload every FULL_RELOAD_SECONDS. After
+# a full reload the caller gets every row, to apply edits and deletions too.
+# Methods may be called from the Sheets worker threads, so state changes are
+# made under a lock.
+
+class SheetIndex:
+    def __init__(self, worksheet, key_column: str = ID_COLUMN):
+        self.worksheet = worksheet
+        self.key_column = key_column
+        self.header = []
+        self.rows = {}
+        self.next_row = 2  # first sheet row not loaded yet (row 1 is the header)
+        self.tail = {}  # row number -> values, for the rows just above next_row
+        self.loaded = False
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.full_reloads = 0
+        self._lock = threading.RLock()
+
+    # --------------------
+    # LOADING
+    # --------------------
+    def load(self):
+        values = self.worksheet.get_all_values()
+        with self._lock:
+            self.header = values[0] if values else []
+            self.rows = {}
+            self.tail = {1: self.header}
+            self.next_row = 2
+            for row_number, row_values in enumerate(values[1:], start=2):
+                self._add(row_number, row_values)
+            self.next_row = max(len(values) + 1, 2)
+            self._trim_tail()
+            self.loaded = True
+            self.loaded_at = self.refreshed_at = time.monotonic()
+        logger.info("Loaded %d rows from %s", len(self.rows), self.worksheet.title)
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self.load()
+
+    def refresh(self):
+        # Returns (rows, reloaded): the value lists of rows that were not known
+        # before, or after a full reload every row and reloaded=True. A sheet
+        # without its header row is never reported as a full reload.
+        if not self.loaded or not self.header or time.monotonic() - self.loaded_at >= FULL_RELOAD_SECONDS:
+            self.load()
+            return self.values(), bool(self.header)
+
+        with self._lock:
+            last_col = column_letter(len(self.header))
+            tail_first = max(self.next_row - TAIL_ROWS, 1)
+            tail, new_values = self.worksheet.batch_get([
+                f"A{tail_first}:{last_col}{self.next_row - 1}",
+                f"A{self.next_row}:{last_col}",
+            ])
+            known = [self.tail.get(row_number, []) for row_number in range(tail_first, self.next_row)]
+            if _checksum(tail, len(known)) != _checksum(known, len(known)):
+                logger.info("%s was edited or shortened by hand; reloading it", self.worksheet.title)
+                self.full_reloads += 1
+                self.load()
+                return self.values(), bool(self.header)
+
+            for offset, row_values in enumerate(new_values):
+                self._add(self.next_row + offset, row_values)
+            self.next_row += len(new_values)
+            self._trim_tail()
+            self.refreshed_at = time.monotonic()
+        return new_values, False
+
+    def _add(self, row_number, row_values):
+        row = dict(zip(self.header, row_values))
+        key = str(row.get(self.key_column, "")).strip()
+        if key:
+            self.rows[key] = (row_number, row)
+        if row_number >= self.next_row - TAIL_ROWS:
+            self.tail[row_number] = list(row_values[:len(self.header)])
+
+    def _trim_tail(self):
+        for row_number in [n for n in self.tail if n < self.next_row - TAIL_ROWS]:
+            del self.tail[row_number]
+
+    # --------------------
+    # LOOKUPS
+    # --------------------
+    def contains(self, user_id) -> bool:
+        self.ensure_loaded()
+        return str(user_id) in self.rows
+
+    def get(self, user_id):
+        self.ensure_loaded()
+        return self.rows.get(str(user_id))
+
+    def records(self):
+        self.ensure_loaded()
+        with self._lock:
+            entries = list(self.rows.values())
+        return [row for _, row in sorted(entries, key=lambda entry: entry[0])]
+
+    def values(self):
+        return [list(row.values()) for row in self.records()]
+
+    # --------------------
+    # WRITES
+    # --------------------
+    def append_row(self, values):
+        return self.append_rows([values])[0]
+
+    def append_rows(self, rows):
+        self.ensure_loaded()
+        response = self.worksheet.append_rows(rows)
+        with self._lock:
+            first_row = self._row_from_response(response)
+            for offset, values in enumerate(rows):
+                self._add(first_row + offset, [str(v) for v in values])
+            self.next_row = max(self.next_row, first_row + len(rows))
+            self._trim_tail()
+        return list(range(first_row, first_row + len(rows)))
+
+    def upsert_rows(self, rows):
+        # Rows whose Telegram ID already has a sheet row are rewritten in place
+        # (one batch_update for all of them); the rest are appended. Nothing is
+        # ever deleted, so row numbers never shift under a concurrent write.
+        self.ensure_loaded()
+        updates, appends = [], []
+        for values in rows:
+            values = [str(v) for v in values]
+            entry = self.rows.get(self._key_of(values))
+            if entry is None:
+                appends.append(values)
+            else:
+                updates.append((entry[0], values))
+
+        if updates:
+            self.worksheet.batch_update([
+                {"range": self._row_range(row_number, len(values)), "values": [values]}
+                for row_number, values in updates
+            ])
+            with self._lock:
+                for row_number, values in updates:
+                    self._add(row_number, values)
+        if appends:
+            self.append_rows(appends)
+
+    def blank(self, user_id) -> bool:
+        return self.blank_rows([user_id]) == 1
+
+    def blank_rows(self, user_ids) -> int:
+        # Clear records in place (one batch_update), keeping only the Telegram
+        # ID so each row can be reused by the next upsert for the same member
+        self.ensure_loaded()
+        blanks = []
+        for user_id in user_ids:
+            entry = self.rows.get(str(user_id))
+            if entry is None:
+                continue
+            values = ["" for _ in self.header]
+            values[self.header.index(self.key_column)] = str(user_id)
+            blanks.append((entry[0], values))
+        if not blanks:
+            return 0
+
+        self.worksheet.batch_update([
+            {"range": self._row_range(row_number, len(values)), "values": [values]}
+            for row_number, values in blanks
+        ])
+        with self._lock:
+            for row_number, values in blanks:
+                self._add(row_number, values)
+        return len(blanks)
+
+    def clear(self):
+        # Remove every data row, keeping the header
+        self.ensure_loaded()
+        with self._lock:
+            if self.next_row > 2:
+                self.worksheet.delete_rows(2, self.next_row - 1)
+            self.rows = {}
+            self.tail = {1: self.header}
+            self.next_row = 2
+
+    def _key_of(self, values) -> str:
+        return str(dict(zip(self.header, values)).get(self.key_column, "")).strip()
+
+    def _row_range(self, row_number, width):
+        return f"A{row_number}:{column_letter(width)}{row_number}"
+
+    def _row_from_response(self, response):
+        try:
+            match = _UPDATED_RANGE_ROW.search(response["updates"]["updatedRange"])
+            return int(match.group(1))
+        except (TypeError, KeyError, AttributeError):
+            return self.next_row
+
+
+def _checksum(rows, count: int) -> str:
+    # The Sheets API leaves out trailing empty cells and rows; so does this
+    rows = [[str(value) for value in row] for row in rows] + [[]] * (count - len(rows))
+    for row in rows:
+        while row and row[-1] == "":
+            row.pop()
+    return hashlib.sha1(json.dumps(rows).encode()).hexdigest()
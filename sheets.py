@@ -0,0 +1,215 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gspread.exceptions import APIError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+SHEETS_MAX_WORKERS = int(os.getenv("SHEETS_MAX_WORKERS", "8"))
+
+# Seconds to wait for each kind of Sheets call before giving up on it
+TIMEOUTS = {
+    "read": float(os.getenv("SHEETS_READ_TIMEOUT", "10")),
+    "write": float(os.getenv("SHEETS_WRITE_TIMEOUT", "20")),
+    "load": float(os.getenv("SHEETS_LOAD_TIMEOUT", "60")),
+}
+
+# Requests per minute we allow ourselves (Google's default is 60 per user per
+# minute for each of reads and writes); 0 turns the limit off
+READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+BURST = int(os.getenv("SHEETS_BURST", "10"))
+
+QUOTA_RETRIES = int(os.getenv("SHEETS_QUOTA_RETRIES", "5"))
+MAX_QUOTA_BACKOFF_SECONDS = 64
+
+
+# ==========================
+# RATE LIMITING
+# ==========================
+
+class TokenBucket:
+    def __init__(self, per_minute: int, burst: int = BURST):
+        self.rate = per_minute / 60
+        self.capacity = max(1, min(burst, per_minute)) if per_minute else 0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        # The lock queues callers, so tokens go out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def empty(self):
+        # After a 429 the quota is spent; make everyone wait for fresh tokens
+        self.tokens = 0
+        self.updated = time.monotonic()
+
+
+BUCKETS = {
+    "read": TokenBucket(READS_PER_MINUTE),
+    "write": TokenBucket(WRITES_PER_MINUTE),
+}
+BUCKETS["load"] = BUCKETS["read"]
+
+
+# ==========================
+# ASYNC SHEETS ACCESS
+# ==========================
+# gspread is blocking HTTP. Every Sheets call goes through run() so it
+# executes on a small thread pool and the event loop keeps serving other voters.
+# run() also
+#   - waits for a token from the read or write bucket before each request,
+#   - shares one in-flight request between identical concurrent reads,
+#   - retries HTTP 429 with exponential backoff and jitter instead of failing.
+
+_executor = ThreadPoolExecutor(max_workers=SHEETS_MAX_WORKERS, thread_name_prefix="sheets")
+_inflight = {}
+
+
+class SheetsError(Exception):
+    pass
+
+
+class SheetsTimeout(SheetsError):
+    pass
+
+
+class SheetsQuotaExceeded(SheetsError):
+    pass
+
+
+async def run(fn, *args, op="read", **kwargs):
+    if op == "write":
+        return await _call(fn, args, kwargs, op)
+
+    key = (fn, args, tuple(sorted(kwargs.items())))
+    try:
+        task = _inflight.get(key)
+    except TypeError:  # unhashable arguments; don't coalesce
+        return await _call(fn, args, kwargs, op)
+
+    if task is None:
+        task = asyncio.ensure_future(_call(fn, args, kwargs, op))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        metrics.SHEETS_COALESCED.inc()
+    # A cancelled waiter must not cancel the request the others are waiting on
+    return await asyncio.shield(task)
+
+
+async def _call(fn, args, kwargs, op):
+    loop = asyncio.get_running_loop()
+    name = getattr(fn, "__name__", fn)
+    for attempt in range(QUOTA_RETRIES + 1):
+        await BUCKETS[op].acquire()
+        future = loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, TIMEOUTS[op])
+        except asyncio.TimeoutError:
+            # The worker thread cannot be interrupted; it finishes in the background
+            logger.warning("Sheets %s call %s timed out after %ss", op, name, TIMEOUTS[op])
+            raise SheetsTimeout(f"Google Sheets {op} timed out") from None
+        except APIError as error:
+            if getattr(error, "code", None) != 429:
+                raise
+            if attempt == QUOTA_RETRIES:
+                raise SheetsQuotaExceeded(f"Google Sheets {op} quota exceeded") from error
+            BUCKETS[op].empty()
+            delay = min(2 ** attempt, MAX_QUOTA_BACKOFF_SECONDS) + random.uniform(0, 1)
+            metrics.SHEETS_QUOTA_RETRIES.labels(op).inc()
+            logger.warning("Sheets %s call %s hit the quota; retrying in %.1fs", op, name, delay)
+            await asyncio.sleep(delay)
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --------------------
+# INDEX HELPERS
+# --------------------
+async def index_refresh(index):
+    return await run(index.refresh, op="load")
+
+
+# ==========================
+# LAZY SPREADSHEET
+# ==========================
+# Authorizing and opening the spreadsheet costs several API round trips and
+# fails outright without credentials, so none of it happens at import time.
+# The spreadsheet is opened once, by the first call that needs it; each
+# worksheet is opened on its first use from whichever worker thread gets
+# there first, so the worksheets open concurrently.
+
+class Workbook:
+    def __init__(self, connect, title: str, wrap=None):
+        # connect() returns an authorized gspread client
+        self._connect = connect
+        self.title = title
+        self._wrap = wrap or (lambda worksheet: worksheet)
+        self.client = None
+        self._spreadsheet = None
+        self._lock = threading.Lock()
+
+    def spreadsheet(self):
+        with self._lock:
+            if self._spreadsheet is None:
+                started = time.perf_counter()
+                self.client = self._connect()
+                self._spreadsheet = self.client.open(self.title)
+                logger.info("Opened spreadsheet %s in %.2fs", self.title, time.perf_counter() - started)
+            return self._spreadsheet
+
+    def worksheet(self, title: str):
+        return LazyWorksheet(self, title)
+
+
+class LazyWorksheet:
+    # Stands in for a gspread Worksheet; title is known up front
+    def __init__(self, workbook: Workbook, title: str):
+        self.workbook = workbook
+        self.title = title
+        self._worksheet = None
+        self._lock = threading.Lock()
+
+    @property
+    def opened(self) -> bool:
+        return self._worksheet is not None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._open(), name)
+
+    def _open(self):
+        with self._lock:
+            if self._worksheet is None:
+                started = time.perf_counter()
+                worksheet = self.workbook.spreadsheet().worksheet(self.title)
+                self._worksheet = self.workbook._wrap(worksheet)
+                logger.info("Opened worksheet %s in %.2fs", self.title, time.perf_counter() - started)
+            return self._worksheet
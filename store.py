@@ -0,0 +1,355 @@
+import json
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+DB_PATH = os.getenv("DB_PATH", "aghai.db")
+
+# Columns of each table, in the same order as the mirrored worksheet
+COLUMNS = {
+    "registrations": [
+        "submitted_at", "telegram_id", "full_name", "address", "mobile", "email",
+        "membership_status", "attendance", "nomination", "nominee_names", "declaration",
+    ],
+    "ballots": ["cast_at", "telegram_id", "name", "q1", "q2", "q3", "q4"],
+    "proxies": [
+        "submitted_at", "telegram_id", "member_name", "member_lot", "member_address",
+        "proxy_name", "proxy_lot", "mobile", "signature_date",
+    ],
+}
+
+# Applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    """
+    CREATE TABLE registrations (
+        telegram_id TEXT PRIMARY KEY,
+        submitted_at TEXT, full_name TEXT, address TEXT, mobile TEXT, email TEXT,
+        membership_status TEXT, attendance TEXT, nomination TEXT, nominee_names TEXT,
+        declaration TEXT
+    );
+    CREATE INDEX idx_registrations_address ON registrations (address);
+
+    CREATE TABLE ballots (
+        telegram_id TEXT PRIMARY KEY,
+        cast_at TEXT, name TEXT, q1 TEXT, q2 TEXT, q3 TEXT, q4 TEXT
+    );
+
+    CREATE TABLE proxies (
+        telegram_id TEXT PRIMARY KEY,
+        submitted_at TEXT, member_name TEXT, member_lot TEXT, member_address TEXT,
+        proxy_name TEXT, proxy_lot TEXT, mobile TEXT, signature_date TEXT
+    );
+    CREATE INDEX idx_proxies_member_lot ON proxies (member_lot);
+    CREATE INDEX idx_proxies_proxy_lot ON proxies (proxy_lot);
+
+    -- Changes still to be copied to the Google Sheets mirror
+    CREATE TABLE outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        sheet TEXT NOT NULL,
+        op TEXT NOT NULL,
+        key TEXT,
+        row TEXT
+    );
+    """,
+    """
+    -- Keys of submissions already applied, so a repeated submit is a no-op
+    CREATE TABLE idempotency_keys (
+        key TEXT PRIMARY KEY,
+        telegram_id TEXT,
+        used_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    -- Conversation states and user_data, kept by persistence.SQLitePersistence
+    CREATE TABLE conversations (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (name, key)
+    );
+    CREATE TABLE user_data (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    """,
+    """
+    -- Member broadcasts and the delivery status of each recipient
+    CREATE TABLE broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        text TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        finished_at TEXT
+    );
+    CREATE TABLE broadcast_recipients (
+        broadcast_id INTEGER NOT NULL,
+        telegram_id TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',  -- pending, delivered, failed, blocked
+        error TEXT,
+        PRIMARY KEY (broadcast_id, telegram_id)
+    );
+    """,
+    """
+    -- Normalized lot keys, kept by lots.LotIndex
+    CREATE TABLE member_lots (
+        telegram_id TEXT PRIMARY KEY,
+        lot_key TEXT NOT NULL
+    );
+    CREATE INDEX idx_member_lots_lot_key ON member_lots (lot_key);
+    CREATE TABLE proxy_lots (
+        telegram_id TEXT PRIMARY KEY,
+        member_lot_key TEXT NOT NULL,
+        proxy_lot_key TEXT NOT NULL
+    );
+    CREATE INDEX idx_proxy_lots_member_lot_key ON proxy_lots (member_lot_key);
+    CREATE INDEX idx_proxy_lots_proxy_lot_key ON proxy_lots (proxy_lot_key);
+    """,
+    """
+    -- Facts about this database, e.g. when the sheets were first imported into it
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+]
+
+
+# ==========================
+# BALLOT STORE
+# ==========================
+# SQLite is the system of record for registrations, ballots and proxies. Every
+# write also queues an outbox entry in the same transaction; the SheetWriter
+# copies those to the worksheets in the background.
+
+class Store:
+    def __init__(self, mirrors, path: str = DB_PATH):
+        # table name -> worksheet title it is mirrored to
+        self.mirrors = mirrors
+        self.path = path
+        self.listeners = []
+        self.columns = {table: list(columns) for table, columns in COLUMNS.items()}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            with self.conn:
+                self.conn.executescript(script)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+            logger.info("Applied store migration %d", number)
+
+    def add_table(self, table: str, columns, worksheet: str):
+        # A table defined at runtime (one per election), keyed by telegram_id like
+        # the others. Columns added to the definition later are added to the table.
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (telegram_id TEXT PRIMARY KEY)")
+            existing = {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+        self.columns[table] = list(columns)
+        self.mirrors[table] = worksheet
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def subscribe(self, listener):
+        # listener(table, op, key, values) runs after each committed write
+        self.listeners.append(listener)
+
+    def _notify(self, table, op, key=None, values=None):
+        for listener in self.listeners:
+            listener(table, op, key, values)
+
+    # --------------------
+    # READS
+    # --------------------
+    def has(self, table: str, user_id) -> bool:
+        row = self.conn.execute(f"SELECT 1 FROM {table} WHERE telegram_id = ?", (str(user_id),)).fetchone()
+        return row is not None
+
+    def get(self, table: str, user_id):
+        row = self.conn.execute(f"SELECT * FROM {table} WHERE telegram_id = ?", (str(user_id),)).fetchone()
+        return dict(row) if row else None
+
+    def rows(self, table: str):
+        return [dict(row) for row in self.conn.execute(f"SELECT * FROM {table} ORDER BY rowid")]
+
+    def page(self, table: str, offset: int, limit: int):
+        return [
+            dict(row) for row in self.conn.execute(
+                f"SELECT * FROM {table} ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)
+            )
+        ]
+
+    def iter_rows(self, table: str):
+        # Streams rows from a cursor instead of building a list
+        cursor = self.conn.execute(f"SELECT {', '.join(self.columns[table])} FROM {table} ORDER BY rowid")
+        for row in cursor:
+            yield tuple(row)
+
+    def count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    # --------------------
+    # WRITES
+    # --------------------
+    def insert(self, table: str, values, idempotency_key: str = None) -> bool:
+        # With an idempotency_key, a second insert under the same key does
+        # nothing and returns False
+        values = [str(v) for v in values]
+        record = dict(zip(self.columns[table], values))
+        with self.conn:
+            if idempotency_key is not None:
+                used = self.conn.execute(
+                    "INSERT OR IGNORE INTO idempotency_keys (key, telegram_id) VALUES (?, ?)",
+                    (idempotency_key, record["telegram_id"]),
+                )
+                if not used.rowcount:
+                    return False
+            self.conn.execute(self._insert_sql(table, "INSERT"), record)
+            self._queue(table, "upsert", record["telegram_id"], values)
+        self._notify(table, "insert", record["telegram_id"], values)
+        return True
+
+    def delete(self, table: str, user_id) -> bool:
+        key = str(user_id)
+        with self.conn:
+            row = self.conn.execute(f"SELECT * FROM {table} WHERE telegram_id = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute(f"DELETE FROM {table} WHERE telegram_id = ?", (key,))
+            self._queue(table, "delete", key)
+        # Listeners get the removed row so they can undo its effect
+        self._notify(table, "delete", key, [row[column] for column in self.columns[table]])
+        return True
+
+    def clear(self, table: str) -> int:
+        with self.conn:
+            deleted = self.conn.execute(f"DELETE FROM {table}").rowcount
+            self._queue(table, "clear")
+        self._notify(table, "clear")
+        return deleted
+
+    def import_rows(self, table: str, rows) -> int:
+        # Rows read from the sheet; they are already mirrored, so nothing is queued.
+        # Keys with a change still in the outbox are left alone.
+        sheet = self.mirrors[table]
+        if self.has_pending_clear(sheet):
+            return 0
+        records = self._sheet_records(table, rows, self.pending_keys(sheet))
+
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(self._insert_sql(table, "INSERT OR IGNORE"), records.values())
+            imported = self.conn.total_changes - before
+        if imported:
+            logger.info("Imported %d rows into %s from the sheet", imported, table)
+            self._notify(table, "import")
+        return imported
+
+    def sync_rows(self, table: str, rows) -> int:
+        # Every row of the sheet, after a full read: like import_rows, but rows
+        # edited on the sheet replace the stored ones and records missing from
+        # it (or blanked) are deleted. Nothing is queued, and keys with a change
+        # still in the outbox are left alone.
+        sheet = self.mirrors[table]
+        if self.has_pending_clear(sheet):
+            return 0
+        skip = self.pending_keys(sheet)
+        records = self._sheet_records(table, rows, skip)
+        columns = self.columns[table]
+
+        changed, removed = [], []
+        for row in self.conn.execute(f"SELECT {', '.join(columns)} FROM {table}"):
+            key = row["telegram_id"]
+            if key in skip:
+                continue
+            record = records.pop(key, None)
+            if record is None:
+                removed.append((key,))
+            elif any(record[column] != (row[column] or "") for column in columns):
+                changed.append(record)
+        changed.extend(records.values())  # not in the store yet
+
+        if not changed and not removed:
+            return 0
+        with self.conn:
+            self.conn.executemany(f"DELETE FROM {table} WHERE telegram_id = ?", removed)
+            self.conn.executemany(self._insert_sql(table, "INSERT OR REPLACE"), changed)
+        logger.info("Synced %s from the sheet: %d rows written, %d removed", table, len(changed), len(removed))
+        self._notify(table, "import")
+        return len(changed) + len(removed)
+
+    def _sheet_records(self, table, rows, skip):
+        # telegram_id -> record for the sheet rows holding a record
+        columns = self.columns[table]
+        records = {}
+        for values in rows:
+            record = dict(zip(columns, [str(v) for v in values]))
+            for column in columns[len(values):]:
+                record[column] = ""
+            if not record["telegram_id"] or record["telegram_id"] in skip:
+                continue
+            # A row holding nothing but the Telegram ID is a cleared record
+            if any(value for column, value in record.items() if column != "telegram_id"):
+                records.setdefault(record["telegram_id"], record)
+        return records
+
+    def _insert_sql(self, table, verb):
+        columns = self.columns[table]
+        return (
+            f"{verb} INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + column for column in columns)})"
+        )
+
+    # --------------------
+    # SHEETS OUTBOX
+    # --------------------
+    def _queue(self, table, op, key=None, values=None):
+        self.conn.execute(
+            "INSERT INTO outbox (sheet, op, key, row) VALUES (?, ?, ?, ?)",
+            (self.mirrors[table], op, key, json.dumps(values) if values is not None else None),
+        )
+
+    def pending_ops(self, limit: int):
+        return [
+            {**dict(row), "row": json.loads(row["row"]) if row["row"] else None}
+            for row in self.conn.execute("SELECT * FROM outbox ORDER BY seq LIMIT ?", (limit,))
+        ]
+
+    def pending_keys(self, sheet: str):
+        return {
+            row[0] for row in self.conn.execute(
+                "SELECT key FROM outbox WHERE sheet = ? AND key IS NOT NULL", (sheet,)
+            )
+        }
+
+    def has_pending_clear(self, sheet: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM outbox WHERE sheet = ? AND op = 'clear'", (sheet,)).fetchone()
+        return row is not None
+
+    def outbox_size(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def ack_ops(self, seqs):
+        with self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq in seqs])
@@ -0,0 +1,54 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# RUNNING TALLY
+# ==========================
+# Per-question, per-option counters kept in step with the ballots table, so
+# /results reads them instead of recounting every ballot. Subscribe it to the
+# store and it follows every recorded, revoked and cleared ballot; rebuild()
+# recounts from the store at startup or after rows are imported from a sheet.
+
+class Tally:
+    def __init__(self, options, table: str = "ballots"):
+        self.options = options
+        self.table = table
+        self.counts = {}
+        self.total = 0
+        self.reset()
+
+    def reset(self):
+        self.counts = {q: {opt: 0 for opt in opts} for q, opts in self.options.items()}
+        self.total = 0
+
+    def rebuild(self, store):
+        self.reset()
+        for q in self.options:
+            for answer, votes in store.conn.execute(f"SELECT {q}, COUNT(*) FROM {self.table} GROUP BY {q}"):
+                if answer in self.counts[q]:
+                    self.counts[q][answer] = votes
+        self.total = store.count(self.table)
+        logger.info("Tally for %s rebuilt from %d ballots", self.table, self.total)
+
+    def add(self, answers, weight: int = 1):
+        for q, counts in self.counts.items():
+            if answers.get(q) in counts:
+                counts[answers[q]] += weight
+        self.total += weight
+
+    def on_change(self, store, table, op, values):
+        if table != self.table:
+            return
+        if op == "insert":
+            self.add(dict(zip(store.columns[table], values)))
+        elif op == "delete":
+            self.add(dict(zip(store.columns[table], values)), weight=-1)
+        elif op == "clear":
+            self.reset()
+        elif op == "import":
+            self.rebuild(store)
+
+    def attach(self, store):
+        store.subscribe(lambda table, op, key, values: self.on_change(store, table, op, values))
+        self.rebuild(store)
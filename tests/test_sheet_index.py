@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip("gspread")
+
+import sheet_index  # noqa: E402
+from fake_gspread import FakeClient  # noqa: E402
+from sheet_index import SheetIndex  # noqa: E402
+
+HEADER = ["Timestamp", "Telegram ID", "Name", "Q1"]
+
+
+def make_index(rows):
+    client = FakeClient(latency=0, quota_per_minute=0)
+    worksheet = client.open("test").worksheet("voting_records")
+    worksheet.cells = [list(HEADER)] + [list(row) for row in rows]
+    index = SheetIndex(worksheet)
+    index.load()
+    return client, worksheet, index
+
+
+def ballot(n, answer="APPROVE"):
+    return ["2026-02-01 10:00:00", str(n), f"Member {n}", answer]
+
+
+def test_refresh_reads_only_new_rows_in_one_call():
+    client, worksheet, index = make_index([ballot(n) for n in range(1, 11)])
+    worksheet.cells.append(ballot(11))
+    worksheet.cells.append(ballot(12))
+
+    calls = client.calls
+    rows, reloaded = index.refresh()
+
+    assert client.calls == calls + 1
+    assert not reloaded
+    assert rows == [ballot(11), ballot(12)]
+    assert index.get(12)[0] == 13
+    assert index.full_reloads == 0
+
+
+def test_own_writes_keep_the_watermark():
+    client, worksheet, index = make_index([ballot(n) for n in range(1, 6)])
+    index.upsert_rows([ballot(5, "REJECT"), ballot(6)])
+    index.blank_rows(["4"])
+
+    rows, reloaded = index.refresh()
+
+    assert (rows, reloaded) == ([], False)
+    assert index.full_reloads == 0
+
+
+def test_edited_tail_row_triggers_a_full_reload():
+    client, worksheet, index = make_index([ballot(n) for n in range(1, 11)])
+    worksheet.cells[-1][3] = "REJECT"
+
+    rows, reloaded = index.refresh()
+
+    assert reloaded
+    assert index.full_reloads == 1
+    assert ballot(10, "REJECT") in rows
+    assert len(rows) == 10
+
+
+def test_deleted_row_triggers_a_full_reload():
+    client, worksheet, index = make_index([ballot(n) for n in range(1, 11)])
+    del worksheet.cells[9]
+
+    rows, reloaded = index.refresh()
+
+    assert reloaded
+    assert not index.contains(9)
+    assert index.get(10)[0] == 10
+
+
+def test_edits_above_the_tail_wait_for_the_periodic_reload(monkeypatch):
+    client, worksheet, index = make_index([ballot(n) for n in range(1, 21)])
+    worksheet.cells[1][3] = "REJECT"
+
+    assert index.refresh() == ([], False)
+
+    monkeypatch.setattr(sheet_index, "FULL_RELOAD_SECONDS", 0)
+    rows, reloaded = index.refresh()
+    assert reloaded
+    assert ballot(1, "REJECT") in rows
@@ -0,0 +1,60 @@
+from store import Store
+
+
+def make_store():
+    store = Store({"registrations": "r", "ballots": "b", "proxies": "p"}, ":memory:")
+    changes = []
+    store.subscribe(lambda table, op, key, values: changes.append((table, op)))
+    return store, changes
+
+
+def ballot(n, answer="APPROVE"):
+    return ["2026-02-01 10:00:00", str(n), f"Member {n}", answer, "", "", ""]
+
+
+def test_import_rows_only_adds():
+    store, changes = make_store()
+    store.import_rows("ballots", [ballot(1), ballot(2)])
+
+    assert store.import_rows("ballots", [ballot(1, "REJECT")]) == 0
+    assert store.get("ballots", 1)["q1"] == "APPROVE"
+    assert store.count("ballots") == 2
+
+
+def test_sync_rows_applies_edits_and_deletions():
+    store, changes = make_store()
+    store.import_rows("ballots", [ballot(1), ballot(2), ballot(3)])
+    changes.clear()
+
+    blanked = ["", "3", "", "", "", "", ""]
+    assert store.sync_rows("ballots", [ballot(1, "REJECT"), blanked, ballot(4)]) == 4
+
+    assert store.get("ballots", 1)["q1"] == "REJECT"
+    assert not store.has("ballots", 2)
+    assert not store.has("ballots", 3)
+    assert store.has("ballots", 4)
+    assert store.outbox_size() == 0
+    assert changes == [("ballots", "import")]
+
+
+def test_sync_rows_leaves_pending_keys_alone():
+    store, changes = make_store()
+    store.import_rows("ballots", [ballot(1), ballot(2)])
+    store.insert("ballots", ballot(5))  # not on the sheet yet
+    store.delete("ballots", 2)
+    store.insert("ballots", ballot(2, "REJECT"))
+    changes.clear()
+
+    assert store.sync_rows("ballots", [ballot(1), ballot(2)]) == 0
+    assert store.get("ballots", 2)["q1"] == "REJECT"
+    assert store.has("ballots", 5)
+    assert changes == []
+
+
+def test_sync_rows_waits_for_a_pending_clear():
+    store, changes = make_store()
+    store.import_rows("ballots", [ballot(1)])
+    store.clear("ballots")
+
+    assert store.sync_rows("ballots", [ballot(1)]) == 0
+    assert store.count("ballots") == 0
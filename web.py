@@ -0,0 +1,137 @@
+import asyncio
+import hmac
+import json
+
+import tornado.httpserver
+import tornado.iostream
+import tornado.web
+from telegram import Update
+
+import metrics
+
+# ==========================
+# WEB SERVER
+# ==========================
+# Runs on the bot's own event loop (tornado ships with the webhooks extra of
+# python-telegram-bot), so there is no second thread or runtime.
+#
+#   /         plain-text banner
+#   /health   200 while the bot and the sheet writer are running, else 503
+#   /status   liveness details as JSON
+#   /metrics  Prometheus metrics
+#   /telegram Telegram webhook (only when a webhook secret is given)
+#   /results/stream  live results as Server-Sent Events (only when a results
+#             token is given; pass it as ?token= or an Authorization: Bearer header)
+
+KEEPALIVE_SECONDS = 15
+
+
+class _Handler(tornado.web.RequestHandler):
+    def initialize(self, bot_app, status, secret=None):
+        self.bot_app = bot_app
+        self.status = status
+        self.secret = secret
+
+    def write_json(self, data, status_code=200):
+        self.set_status(status_code)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(data))
+
+
+class HomeHandler(_Handler):
+    def get(self):
+        self.write("Aghai Elections Bot is running!")
+
+
+class HealthHandler(_Handler):
+    def get(self):
+        status = self.status(self.bot_app)
+        healthy = status["running"] and status["sheet_writer_running"]
+        self.write_json({"ok": healthy}, 200 if healthy else 503)
+
+
+class StatusHandler(_Handler):
+    def get(self):
+        self.write_json(self.status(self.bot_app))
+
+
+class MetricsHandler(_Handler):
+    def get(self):
+        body, content_type = metrics.render()
+        self.set_header("Content-Type", content_type)
+        self.finish(body)
+
+
+class WebhookHandler(_Handler):
+    async def post(self):
+        given = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(given.encode(), self.secret.encode()):
+            raise tornado.web.HTTPError(403)
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(400) from None
+        await self.bot_app.update_queue.put(Update.de_json(data, self.bot_app.bot))
+        self.set_status(200)
+
+
+class ResultsStreamHandler(tornado.web.RequestHandler):
+    def initialize(self, feed, token):
+        self.feed = feed
+        self.token = token
+
+    async def get(self):
+        given = self.get_query_argument("token", "") or self.request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(given.encode(), self.token.encode()):
+            raise tornado.web.HTTPError(403)
+
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")
+        queue = self.feed.subscribe()
+        try:
+            self.write_event("snapshot", self.feed.snapshot())
+            await self.flush()
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                    self.write_event(event, data)
+                except asyncio.TimeoutError:
+                    # Also how a closed connection is noticed when nothing is happening
+                    self.write(": keepalive\n\n")
+                await self.flush()
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            self.feed.unsubscribe(queue)
+
+    def write_event(self, event, data):
+        self.write(f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n")
+
+
+def create_web_app(bot_app, status, webhook_secret=None, results_feed=None, results_token=None) -> tornado.web.Application:
+    # status(bot_app) returns the liveness dict shown on /status
+    args = {"bot_app": bot_app, "status": status, "secret": webhook_secret}
+    routes = [
+        (r"/", HomeHandler, args),
+        (r"/health", HealthHandler, args),
+        (r"/status", StatusHandler, args),
+        (r"/metrics", MetricsHandler, args),
+    ]
+    if webhook_secret:
+        routes.append((r"/telegram", WebhookHandler, args))
+    if results_feed is not None and results_token:
+        routes.append((r"/results/stream", ResultsStreamHandler, {"feed": results_feed, "token": results_token}))
+    return tornado.web.Application(routes)
+
+
+def start_server(web_app, port: int) -> tornado.httpserver.HTTPServer:
+    # Must be called from the running event loop
+    server = tornado.httpserver.HTTPServer(web_app, xheaders=True)
+    server.listen(port, address="0.0.0.0")
+    return server
+
+
+async def stop_server(server):
+    server.stop()
+    await server.close_all_connections()
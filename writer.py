@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+
+import sheets
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURATION
+# ==========================
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+BATCH_SIZE = 200  # rows per append_rows request
+MAX_BACKOFF_SECONDS = 60
+DRAIN_TIMEOUT_SECONDS = 30
+
+# ==========================
+# WRITE-BEHIND SHEET WRITER
+# ==========================
+# The Store commits each change together with an outbox entry. This task
+# copies the outbox to the worksheets. Each batch (up to the next clear) is
+# reduced to the last change per sheet and member, then each sheet gets one
+# upsert: rows already on the sheet are rewritten in place with one
+# batch_update, new ones are added with one append_rows. Deletes blank the
+# members' rows in place with one more batch_update, so rows never shift.
+# Failures back off exponentially; the outbox survives restarts, so anything
+# unflushed is picked up again at startup.
+# start() returns at once: the sheets are loaded in the background and
+# flushing begins when `ready` is set. Handlers only read the Store.
+
+class SheetWriter:
+    def __init__(self, store, indexes):
+        self.store = store
+        self.indexes = {index.worksheet.title: index for index in indexes}
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        # Held while flushing; hold it to read a sheet without a flush landing
+        # in between (the read would miss rows the store no longer has queued)
+        self.lock = asyncio.Lock()
+        self.ready = asyncio.Event()
+        self._task = None
+        self._warm_task = None
+        self._backoff = 0
+        store.subscribe(lambda *change: self._wakeup.set())
+
+    @property
+    def backlog(self) -> int:
+        return self.store.outbox_size()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def imported(self) -> bool:
+        # Whether this store has ever been filled from the sheets; until then
+        # it cannot tell who already registered or voted
+        return self.ready.is_set() or self.store.get_meta("sheets_imported_at") is not None
+
+    @property
+    def retry_in(self) -> float:
+        # Current backoff after failed flushes; 0 while writes are succeeding
+        return self._backoff
+
+    async def start(self):
+        self._warm_task = asyncio.create_task(self._warm())
+        self._task = asyncio.create_task(self._run())
+
+    async def _warm(self):
+        started = time.perf_counter()
+        backoff = 1
+        while True:
+            try:
+                await asyncio.gather(*(sheets.run(index.ensure_loaded, op="load") for index in self.indexes.values()))
+                break
+            except Exception:
+                logger.exception("Could not load the sheets; retrying in %ss", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+        # Rebuild anything the local store is missing (fresh disk, rows added by hand)
+        for table, title in self.store.mirrors.items():
+            self.store.import_rows(table, self.indexes[title].values())
+        self.store.set_meta("sheets_imported_at", time.strftime("%Y-%m-%d %H:%M:%S"))
+        if self.backlog:
+            logger.info("%d sheet changes waiting from the last run", self.backlog)
+        self.ready.set()
+        logger.info("Sheet caches warmed in %.2fs", time.perf_counter() - started)
+
+    async def stop(self):
+        for task in (self._warm_task, self._task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if not self.ready.is_set():
+            return
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final flush failed; %d changes stay in the outbox", self.backlog)
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        # Wait until every queued change is on the sheets
+        while self.backlog:
+            self._flushed.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._flushed.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise sheets.SheetsTimeout("Queued rows could not be written to Google Sheets") from None
+
+    async def _run(self):
+        await self.ready.wait()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.backlog:
+                continue
+
+            # Let a burst of submissions pile up into one batch
+            await asyncio.sleep(max(FLUSH_INTERVAL_SECONDS, self._backoff))
+            try:
+                await self.flush()
+                self._backoff = 0
+            except Exception:
+                self._backoff = min(max(self._backoff * 2, 1), MAX_BACKOFF_SECONDS)
+                logger.exception("Sheet flush failed; %d changes queued, retrying in %ss", self.backlog, self._backoff)
+
+    async def flush(self):
+        async with self.lock:
+            await self._flush()
+
+    async def _flush(self):
+        while True:
+            ops = self.store.pending_ops(BATCH_SIZE)
+            if not ops:
+                break
+
+            if ops[0]["op"] == "clear":
+                await sheets.run(self.indexes[ops[0]["sheet"]].clear, op="write")
+                self.store.ack_ops([ops[0]["seq"]])
+                continue
+
+            # Everything up to the next clear, reduced to the last change per
+            # sheet and member: a blank followed by an upsert is just the upsert
+            batch, latest = [], {}
+            for op in ops:
+                if op["op"] == "clear":
+                    break
+                batch.append(op)
+                latest.setdefault(op["sheet"], {})[op["key"]] = op
+
+            # At most one upsert_rows and one blank_rows call per sheet
+            for sheet, changes in latest.items():
+                index = self.indexes[sheet]
+                # A timed-out attempt may still have landed; don't write those rows twice
+                rows = [
+                    op["row"] for op in changes.values()
+                    if op["op"] == "upsert" and not self._is_written(index, op)
+                ]
+                blanks = [op["key"] for op in changes.values() if op["op"] == "delete"]
+                if rows:
+                    await sheets.run(index.upsert_rows, rows, op="write")
+                if blanks:
+                    await sheets.run(index.blank_rows, blanks, op="write")
+                logger.info("Wrote %d rows to %s and blanked %d", len(rows), sheet, len(blanks))
+
+            self.store.ack_ops([op["seq"] for op in batch])
+        self._flushed.set()
+
+    def _is_written(self, index, op) -> bool:
+        existing = index.get(op["key"])
+        return existing is not None and list(existing[1].values())[:len(op["row"])] == op["row"]